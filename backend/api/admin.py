@@ -1,13 +1,14 @@
+from collections import defaultdict
+
 from django.contrib import admin
+from django.db import transaction
 from django.forms import ModelForm
 from django.forms.widgets import TextInput
 
-from .models import (Cart,
-                     Favorite,
-                     Ingredient,
-                     Recipe,
-                     Tag,
-                     IngredientAmountForRecipe,)
+from .mixins import ChangedFieldsAdminMixin
+from .models import (Cart, Favorite, Ingredient, IngredientAmountForRecipe,
+                     Recipe, ShoppingListItem, Tag)
+from .services import update_recipe_in_shopping_lists
 
 
 class TagForm(ModelForm):
@@ -51,7 +52,7 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ChangedFieldsAdminMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'name',
@@ -66,10 +67,17 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('tags',)
 
     def count_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     count_favorites.short_description = 'Количество добавлений в избранное'
 
+    def get_update_fields(self, obj, form):
+        update_fields = super().get_update_fields(obj, form)
+        if 'name' in update_fields:
+            # slug строится из названия в Recipe.save.
+            update_fields.append('slug')
+        return update_fields
+
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
@@ -77,6 +85,7 @@ class FavoriteAdmin(admin.ModelAdmin):
         'pk',
         'user',
         'recipe',
+        'created',
     )
     search_fields = (
         'user',
@@ -91,6 +100,7 @@ class CartAdmin(admin.ModelAdmin):
         'pk',
         'user',
         'recipe',
+        'created',
     )
     search_fields = (
         'user',
@@ -98,6 +108,11 @@ class CartAdmin(admin.ModelAdmin):
     )
     list_filter = ('user',)
 
+    def has_change_permission(self, request, obj=None):
+        # Списки покупок следят за созданием и удалением Cart
+        # сигналами, перенос связи на другой рецепт они не заметят.
+        return False
+
 
 @admin.register(IngredientAmountForRecipe)
 class IngredientAmountForRecipeAdmin(admin.ModelAdmin):
@@ -112,3 +127,47 @@ class IngredientAmountForRecipeAdmin(admin.ModelAdmin):
         'ingredient',
         'recipe',
     )
+
+    def save_model(self, request, obj, form, change):
+        old = None
+        if change:
+            old = IngredientAmountForRecipe.objects.get(pk=obj.pk)
+        super().save_model(request, obj, form, change)
+        self.update_shopping_lists(old_rows=[old] if old else [],
+                                   new_rows=[obj])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.update_shopping_lists(old_rows=[obj])
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        rows = list(queryset)
+        super().delete_queryset(request, queryset)
+        self.update_shopping_lists(old_rows=rows)
+
+    @staticmethod
+    def update_shopping_lists(old_rows=(), new_rows=()):
+        """
+        Переносит правку состава рецепта в списки покупок: сериализатор
+        рецепта делает это сам, а правки из админки идут мимо него.
+        """
+        amounts = defaultdict(lambda: (defaultdict(int), defaultdict(int)))
+        for index, rows in enumerate((old_rows, new_rows)):
+            for row in rows:
+                amounts[row.recipe_id][index][row.ingredient_id] += row.amount
+        for recipe_id, (old_amounts, new_amounts) in amounts.items():
+            update_recipe_in_shopping_lists(
+                recipe_id, old_amounts, new_amounts
+            )
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'user',
+        'ingredient',
+        'total_amount',
+    )
+    list_filter = ('user',)
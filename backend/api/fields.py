@@ -0,0 +1,107 @@
+import base64
+import binascii
+import hashlib
+import uuid
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+from api.storage import get_name_digest
+
+# Кратно 4, чтобы каждый кусок декодировался независимо.
+BASE64_CHUNK_SIZE = 4 * 64 * 1024
+
+
+class StreamedBase64ImageField(Base64ImageField):
+    """
+    Base64ImageField, который не собирает картинку в памяти.
+
+    Размер проверяется по длине строки ещё до декодирования, а
+    base64 декодируется кусками сразу во временный файл на диске
+    (FILE_UPLOAD_TEMP_DIR), откуда его читают Pillow и хранилище.
+
+    При обновлении объекта вместо base64 можно передать текущее
+    изображение - его URL, имя файла или sha256 содержимого: поле
+    пропускается и файл не трогается. Если же пришёл base64 той же
+    картинки, это видно по хэшу, посчитанному при декодировании,
+    и проверка Pillow с записью на диск не выполняются.
+    """
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать '
+                     '{max_size} байт.',
+    }
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            return super().to_internal_value(base64_data)
+        if ';base64,' in base64_data:
+            base64_data = base64_data.split(';base64,', 1)[1]
+        elif self.is_current_image(base64_data):
+            raise serializers.SkipField()
+        base64_data = ''.join(base64_data.split())
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if len(base64_data) // 4 * 3 > max_size:
+            self.fail('too_large', max_size=max_size)
+        image_file = self.decode_to_file(base64_data)
+        current = self.get_current_image()
+        if current and image_file.digest == get_name_digest(current.name):
+            image_file.close()
+            raise serializers.SkipField()
+        extension = self.get_image_extension(image_file)
+        image_file.name = f'{uuid.uuid4()}.{extension}'
+        return serializers.ImageField.to_internal_value(self, image_file)
+
+    def get_current_image(self):
+        instance = getattr(self.parent, 'instance', None)
+        if instance is None:
+            return None
+        return getattr(instance, self.source, None)
+
+    def is_current_image(self, value):
+        current = self.get_current_image()
+        if not current:
+            return False
+        value = value.strip()
+        if value in (current.name, get_name_digest(current.name)):
+            return True
+        path = urlparse(value).path
+        return bool(path) and path == urlparse(current.url).path
+
+    def decode_to_file(self, base64_data):
+        image_file = TemporaryUploadedFile(
+            'upload', 'application/octet-stream', 0, None
+        )
+        digest = hashlib.sha256()
+        try:
+            for start in range(0, len(base64_data), BASE64_CHUNK_SIZE):
+                chunk = base64.b64decode(
+                    base64_data[start:start + BASE64_CHUNK_SIZE]
+                )
+                digest.update(chunk)
+                image_file.write(chunk)
+        except (TypeError, binascii.Error, ValueError):
+            image_file.close()
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        image_file.digest = digest.hexdigest()
+        image_file.size = image_file.tell()
+        image_file.seek(0)
+        return image_file
+
+    def get_image_extension(self, image_file):
+        try:
+            with Image.open(image_file) as image:
+                extension = image.format.lower()
+        except (OSError, AttributeError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        finally:
+            image_file.seek(0)
+        extension = 'jpg' if extension == 'jpeg' else extension
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        return extension
@@ -1,5 +1,22 @@
-from rest_framework.filters import SearchFilter
+from django.conf import settings
+from rest_framework.filters import BaseFilterBackend
 
+from api.services.ingredient_index import ingredient_index
 
-class IngredientSearchFilter(SearchFilter):
+
+class IngredientSearchFilter(BaseFilterBackend):
     search_param = 'name'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term or view.detail:
+            return queryset
+        if settings.INGREDIENT_SEARCH_IN_MEMORY:
+            ingredients = ingredient_index.search(
+                term, limit=settings.INGREDIENT_SEARCH_LIMIT
+            )
+            if ingredients is not None:
+                return ingredients
+        return queryset.autocomplete(
+            term, limit=settings.INGREDIENT_SEARCH_LIMIT
+        )
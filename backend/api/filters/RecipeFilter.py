@@ -1,18 +1,93 @@
+from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, F, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
 from api.models import Recipe
+from api.services import (get_tag_bits_by_slug, get_tag_ids_by_slug,
+                          get_tags_mask)
 
 User = get_user_model()
 
+ORDERING_CHOICES = (
+    ('popular', 'Популярные'),
+    ('trending', 'Популярные за последние дни'),
+)
+
+TAGS_MODE_CHOICES = (
+    ('any', 'Хотя бы один из тегов'),
+    ('all', 'Все теги'),
+)
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_ids_by_slug()]
+
+
+class TagsFilter(filters.MultipleChoiceFilter):
+    # Поле Django без обёртки django-filter, которая сразу вычисляет
+    # варианты: словарь тегов читается только при непустом ?tags=.
+    field_class = forms.MultipleChoiceField
+
 
 class RecipeFilter(FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagsFilter(
+        choices=tag_choices,
+        method='filter_tags',
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=TAGS_MODE_CHOICES,
+        method='filter_tags_mode',
+    )
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=ORDERING_CHOICES,
+        method='filter_ordering',
+    )
+
+    def filter_tags(self, queryset, name, value):
+        match_all = self.form.cleaned_data.get('tags_mode') == 'all'
+        if settings.RECIPE_TAGS_BITMASK_FILTER:
+            tag_bits_by_slug = get_tag_bits_by_slug()
+            bits = [tag_bits_by_slug[slug] for slug in value]
+            if None not in bits:
+                return self.filter_tags_by_mask(
+                    queryset, get_tags_mask(bits), match_all
+                )
+        tag_ids_by_slug = get_tag_ids_by_slug()
+        return self.filter_tags_by_exists(
+            queryset, {tag_ids_by_slug[slug] for slug in value}, match_all
+        )
+
+    def filter_tags_by_exists(self, queryset, tag_ids, match_all):
+        # EXISTS по индексу (tag_id, recipe_id) вместо JOIN: рецепт с
+        # несколькими подходящими тегами не дублируется, DISTINCT не нужен.
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk')
+        )
+        if match_all:
+            return queryset.filter(*(
+                Exists(recipe_tags.filter(tag_id=tag_id))
+                for tag_id in tag_ids
+            ))
+        return queryset.filter(
+            Exists(recipe_tags.filter(tag_id__in=tag_ids))
+        )
+
+    def filter_tags_by_mask(self, queryset, mask, match_all):
+        queryset = queryset.alias(tags_match=F('tags_mask').bitand(mask))
+        if match_all:
+            return queryset.filter(tags_match=mask)
+        return queryset.exclude(tags_match=0)
+
+    def filter_tags_mode(self, queryset, name, value):
+        # Режим учитывается в filter_tags.
+        return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -24,6 +99,16 @@ class RecipeFilter(FilterSet):
             return queryset.filter(carts__user=self.request.user)
         return queryset
 
+    def filter_ordering(self, queryset, name, value):
+        # Оценки берутся из RecipeScore (команда refresh_recipe_scores);
+        # строка есть у каждого рецепта, новые получают нулевую. INNER
+        # JOIN и сортировка по (оценка DESC, id DESC) совпадают с
+        # индексом recipe_score_*_idx, так что страница читается по
+        # индексу, без полной сортировки.
+        return queryset.filter(score__isnull=False).order_by(
+            F(f'score__{value}').desc(), '-id'
+        )
+
     class Meta:
         model = Recipe
         fields = ('tags', 'author',)
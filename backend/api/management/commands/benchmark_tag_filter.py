@@ -0,0 +1,126 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.filters import RecipeFilter
+from api.models import Recipe, Tag
+from api.services import get_tags_mask
+
+User = get_user_model()
+
+TAGS_COUNT = 8
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает фильтр по тегам через EXISTS по таблице связей и '
+        'через битовую маску Recipe.tags_mask на сгенерированных '
+        'рецептах. Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=1000000,
+            help='Сколько рецептов сгенерировать',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Сколько раз повторить каждый запрос',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Размер пачки для bulk_create',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            tags = self.generate(options['recipes'], options['batch_size'])
+            cases = (
+                ('any, 1 тег', tags[:1], False),
+                ('any, 3 тега', tags[:3], False),
+                ('all, 2 тега', tags[:2], True),
+            )
+            for title, case_tags, match_all in cases:
+                for method, queryset in self.querysets(case_tags, match_all):
+                    self.measure(
+                        f'{title}, {method}', queryset, options['repeat']
+                    )
+            transaction.set_rollback(True)
+
+    def generate(self, count, batch_size):
+        started = time.perf_counter()
+        author = User.objects.create_user(username='tag_filter_benchmark')
+        tags = [
+            Tag.objects.create(
+                name=f'benchmark_{number}',
+                color=f'#BE{number:04X}',
+                slug=f'benchmark_{number}',
+            )
+            for number in range(TAGS_COUNT)
+        ]
+        through = Recipe.tags.through
+        generator = random.Random(0)
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            recipe_tags = [
+                generator.sample(tags, generator.randint(1, 3))
+                for _ in range(size)
+            ]
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name='benchmark',
+                    image='recipes/benchmark.png',
+                    text='benchmark',
+                    cooking_time=1,
+                    tags_mask=get_tags_mask(tag.bit for tag in chosen),
+                )
+                for chosen in recipe_tags
+            )
+            through.objects.bulk_create(
+                through(recipe_id=recipe.pk, tag_id=tag.pk)
+                for recipe, chosen in zip(recipes, recipe_tags)
+                for tag in chosen
+            )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE api_recipe, api_recipe_tags')
+        self.stdout.write(
+            f'Сгенерировано рецептов: {count}, '
+            f'время: {time.perf_counter() - started:.2f} с'
+        )
+        return tags
+
+    def querysets(self, tags, match_all):
+        recipe_filter = RecipeFilter()
+        queryset = Recipe.objects.all()
+        yield 'EXISTS', recipe_filter.filter_tags_by_exists(
+            queryset, {tag.pk for tag in tags}, match_all
+        )
+        yield 'маска', recipe_filter.filter_tags_by_mask(
+            queryset, get_tags_mask(tag.bit for tag in tags), match_all
+        )
+
+    def measure(self, title, queryset, repeat):
+        timings = {'count': [], 'page': []}
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset.count()
+            timings['count'].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            list(queryset.order_by('-id')[:PAGE_SIZE])
+            timings['page'].append(time.perf_counter() - started)
+        self.stdout.write(self.style.SUCCESS(
+            f'[{title}] COUNT: {min(timings["count"]) * 1000:.1f} мс, '
+            f'страница: {min(timings["page"]) * 1000:.1f} мс'
+        ))
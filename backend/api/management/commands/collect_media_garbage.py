@@ -0,0 +1,63 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import Recipe
+from api.services import get_referenced_image_names
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы изображений рецептов, на которые не ссылается ни '
+        'один рецепт (например, оставшиеся после сбоя между записью '
+        'файла и коммитом).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, ничего не удалять',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60,
+            help=(
+                'Не трогать файлы моложе стольких минут: их может '
+                'сейчас сохранять незавершённый запрос'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        storage = field.storage
+        referenced = get_referenced_image_names()
+        threshold = timezone.now() - timedelta(minutes=options['min_age'])
+        deleted = 0
+        for name in self.walk(storage, field.upload_to.rstrip('/')):
+            if name in referenced:
+                continue
+            if storage.get_modified_time(name) > threshold:
+                continue
+            deleted += 1
+            self.stdout.write(name)
+            if not options['dry_run']:
+                storage.delete(name)
+        action = 'Найдено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов без ссылок: {deleted}'
+        ))
+
+    def walk(self, storage, directory):
+        if not storage.exists(directory):
+            return
+        directories, files = storage.listdir(directory)
+        for file_name in files:
+            yield posixpath.join(directory, file_name)
+        for subdirectory in directories:
+            yield from self.walk(
+                storage, posixpath.join(directory, subdirectory)
+            )
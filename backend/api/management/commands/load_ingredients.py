@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import Ingredient
+from api.services import copy_is_available, load_ingredients, read_ingredients
+
+METHODS = ('auto', 'copy', 'orm')
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает каталог ингредиентов из CSV или JSON. '
+        'Существующие ингредиенты не удаляются и не дублируются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=settings.BASE_DIR / 'ingredients.csv',
+            help='Путь к файлу .csv или .json',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create',
+        )
+        parser.add_argument(
+            '--method',
+            choices=METHODS,
+            default='auto',
+            help='copy - COPY FROM STDIN (PostgreSQL), orm - bulk_create, '
+                 'auto - copy, если доступен',
+        )
+        parser.add_argument(
+            '--benchmark',
+            action='store_true',
+            help='Замерить все доступные способы загрузки, '
+                 'откатив изменения',
+        )
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            methods = ['copy', 'orm'] if copy_is_available() else ['orm']
+            for method in methods:
+                with transaction.atomic():
+                    self.load(method, options)
+                    transaction.set_rollback(True)
+            return
+        self.load(options['method'], options)
+
+    def load(self, method, options):
+        path = options['path']
+        count_before = Ingredient.objects.count()
+        started = time.perf_counter()
+        try:
+            total = load_ingredients(
+                read_ingredients(path),
+                method=method,
+                batch_size=options['batch_size'],
+            )
+        except (OSError, KeyError, IndexError, ValueError) as error:
+            raise CommandError(f'Не удалось загрузить {path}: {error}')
+        elapsed = time.perf_counter() - started
+        created = Ingredient.objects.count() - count_before
+        self.stdout.write(self.style.SUCCESS(
+            f'[{method}] Прочитано строк: {total}, '
+            f'добавлено ингредиентов: {created}, время: {elapsed:.2f} с'
+        ))
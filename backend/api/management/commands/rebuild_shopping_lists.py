@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services import (calculate_shopping_lists, get_stored_shopping_lists,
+                          rebuild_shopping_lists)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает таблицу списков покупок по корзинам пользователей. '
+        'С флагом --verify только сверяет её с корзинами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только проверить таблицу, ничего не изменяя',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            rebuild_shopping_lists()
+            self.stdout.write(self.style.SUCCESS('Списки покупок пересчитаны'))
+            return
+
+        expected = calculate_shopping_lists()
+        stored = get_stored_shopping_lists()
+        mismatches = [
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        ]
+        for user_id, ingredient_id in sorted(mismatches):
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'ожидается {expected.get((user_id, ingredient_id))}, '
+                f'в таблице {stored.get((user_id, ingredient_id))}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'Найдено расхождений: {len(mismatches)}. '
+                f'Запустите команду без --verify.'
+            )
+        self.stdout.write(self.style.SUCCESS('Списки покупок совпадают'))
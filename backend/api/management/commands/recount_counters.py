@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.services import recount_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики избранного, корзин, рецептов и '
+        'подписчиков по исходным таблицам.'
+    )
+
+    def handle(self, *args, **options):
+        profiles, recipes = recount_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано профилей: {profiles}, рецептов: {recipes}'
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Recipe
+from api.services import generate_image_variants
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные копии изображений рецептов. По умолчанию '
+        'только для рецептов, у которых их ещё нет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить варианты у всех рецептов',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        done = failed = 0
+        for pk in recipes.values_list('pk', flat=True).iterator():
+            try:
+                generate_image_variants(pk)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {pk}: {error}')
+            else:
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {done}, с ошибками: {failed}'
+        ))
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from api.services import refresh_recipe_scores
+from api.services.recipe_scores import TRENDING_HALF_LIFE, TRENDING_WINDOW
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает оценки рецептов для сортировок popular и '
+        'trending. Рассчитан на запуск по расписанию (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window-days',
+            type=float,
+            default=TRENDING_WINDOW / timedelta(days=1),
+            help='За сколько последних дней учитывать добавления '
+                 'для trending',
+        )
+        parser.add_argument(
+            '--half-life-hours',
+            type=float,
+            default=TRENDING_HALF_LIFE / timedelta(hours=1),
+            help='За сколько часов вес добавления уменьшается вдвое',
+        )
+
+    def handle(self, *args, **options):
+        count = refresh_recipe_scores(
+            window=timedelta(days=options['window_days']),
+            half_life=timedelta(hours=options['half_life_hours']),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны оценки рецептов: {count}'
+        ))
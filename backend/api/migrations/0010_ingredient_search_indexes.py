@@ -0,0 +1,42 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Индексы нужны только в PostgreSQL: в SQLite нет ни text_pattern_ops,
+# ни pg_trgm, а поиск там работает и без них.
+CREATE_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS api_ingredient_name_prefix '
+    'ON api_ingredient (UPPER(name::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS api_ingredient_name_upper_trgm '
+    'ON api_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS api_ingredient_name_trgm '
+    'ON api_ingredient USING gin (name gin_trgm_ops)',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS api_ingredient_name_prefix',
+    'DROP INDEX IF EXISTS api_ingredient_name_upper_trgm',
+    'DROP INDEX IF EXISTS api_ingredient_name_trgm',
+)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_shoppinglistitem'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(
+            run_on_postgresql(CREATE_INDEXES),
+            run_on_postgresql(DROP_INDEXES),
+        ),
+    ]
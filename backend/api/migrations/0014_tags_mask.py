@@ -0,0 +1,38 @@
+# Generated by Django 4.0.10 on 2026-10-18 19:20
+
+from django.db import migrations, models
+from django.db.models import F
+
+TAGS_MASK_BITS = 63
+
+
+def fill_tags_mask(apps, schema_editor):
+    Tag = apps.get_model('api', 'Tag')
+    Recipe = apps.get_model('api', 'Recipe')
+    for bit, tag in enumerate(Tag.objects.order_by('id')[:TAGS_MASK_BITS]):
+        tag.bit = bit
+        tag.save(update_fields=['bit'])
+        Recipe.objects.filter(tags=tag).update(
+            tags_mask=F('tags_mask').bitor(1 << bit)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Битовая маска тегов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True, verbose_name='Номер бита в Recipe.tags_mask'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+    ]
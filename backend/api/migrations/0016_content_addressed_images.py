@@ -0,0 +1,20 @@
+# Generated by Django 4.0.10 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+import api.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, storage=api.storage.get_recipe_image_storage, upload_to='recipes/', verbose_name='Фото'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.0.10 on 2026-10-18 19:56
+
+from django.db import migrations
+
+
+def create_missing_scores(apps, schema_editor):
+    Recipe = apps.get_model('api', 'Recipe')
+    RecipeScore = apps.get_model('api', 'RecipeScore')
+    RecipeScore.objects.bulk_create(
+        (
+            RecipeScore(
+                recipe_id=pk,
+                popular=favorites_count + 2 * carts_count,
+            )
+            for pk, favorites_count, carts_count in Recipe.objects.filter(
+                score__isnull=True
+            ).values_list('pk', 'favorites_count', 'carts_count').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+import json
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.versions import get_version
+
+RESPONSE_KEY = 'api:response:{}:{}'
+
+
+class CachedReferenceDataMixin:
+    """
+    Кэширует ответы list/retrieve справочников и отдаёт ETag и
+    Last-Modified. Кэш сбрасывается сменой версии cache_version
+    (её меняют сигналы моделей), поэтому на повторный запрос с
+    If-None-Match клиент получает 304 без обращения к БД.
+
+    Без общего кэша (settings.CACHE_IS_SHARED) версия в другом процессе
+    не обновится, поэтому ответ каждый раз строится заново, а ETag
+    считается по его содержимому.
+    """
+    cache_version = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, view_method, request, *args, **kwargs):
+        if not settings.CACHE_IS_SHARED:
+            return self.conditional_response(
+                view_method, request, *args, **kwargs
+            )
+        version = get_version(self.cache_version)
+        digest = md5(
+            f'{version.token}:{request.get_full_path()}'.encode()
+        ).hexdigest()
+        headers = {
+            'ETag': quote_etag(digest),
+            'Last-Modified': http_date(version.updated),
+        }
+
+        not_modified = get_conditional_response(
+            request,
+            etag=headers['ETag'],
+            last_modified=version.updated,
+            response=HttpResponse(headers=headers),
+        )
+        if not_modified.status_code == status.HTTP_304_NOT_MODIFIED:
+            return not_modified
+
+        key = RESPONSE_KEY.format(self.cache_version, digest)
+        data = cache.get(key)
+        if data is None:
+            response = view_method(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.REFERENCE_DATA_CACHE_TIMEOUT)
+        return Response(data, headers=headers)
+
+    def conditional_response(self, view_method, request, *args, **kwargs):
+        response = view_method(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        etag = quote_etag(md5(
+            json.dumps(response.data, sort_keys=True).encode()
+        ).hexdigest())
+        not_modified = get_conditional_response(
+            request,
+            etag=etag,
+            response=HttpResponse(headers={'ETag': etag}),
+        )
+        if not_modified.status_code == status.HTTP_304_NOT_MODIFIED:
+            return not_modified
+        response['ETag'] = etag
+        return response
+
+
+class ChangedFieldsAdminMixin:
+    """
+    При изменении объекта в админке сохраняет только поля, изменённые
+    в форме. Полное сохранение записало бы поверх счётчиков, изменённых
+    параллельно через F(), значения, прочитанные при открытии формы.
+    """
+
+    def get_update_fields(self, obj, form):
+        fields = {field.name for field in obj._meta.concrete_fields}
+        return [name for name in form.changed_data if name in fields]
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        obj.save(update_fields=self.get_update_fields(obj, form))
@@ -1,12 +1,66 @@
 from django.contrib.auth import get_user_model
 from django.core import validators
-from django.db import models
-
+from django.db import connections, models
+from django.db.models import Case, Exists, OuterRef, Prefetch, Q, Value, When
 from slugify import slugify
 
+from api.storage import get_recipe_image_storage
+from users.models import Follow
+
 User = get_user_model()
 
 
+# Короче трёх символов триграммы бесполезны: ищем только по началу
+# названия, по индексу UPPER(name) text_pattern_ops.
+INGREDIENT_SUBSTRING_SEARCH_MIN_LENGTH = 3
+
+# Recipe.tags_mask - знаковый bigint, старший бит не используем.
+TAGS_MASK_BITS = 63
+
+
+class IngredientQuerySet(models.QuerySet):
+    def autocomplete(self, term, limit=None):
+        """
+        Поиск ингредиента для автодополнения.
+
+        Сначала идут совпадения по началу названия, затем по подстроке,
+        оба списка по алфавиту. В PostgreSQL после них добавляются
+        похожие по триграммам названия (опечатки) в порядке сходства.
+        """
+        starts_with = Q(name__istartswith=term)
+        if len(term) < INGREDIENT_SUBSTRING_SEARCH_MIN_LENGTH:
+            queryset = self.filter(starts_with).annotate(
+                search_rank=Value(0),
+            ).order_by('name', 'id')
+        elif connections[self.db].vendor == 'postgresql':
+            from django.contrib.postgres.search import TrigramSimilarity
+
+            contains = Q(name__icontains=term)
+            queryset = self.filter(
+                contains | Q(name__trigram_similar=term)
+            ).annotate(
+                search_rank=Case(
+                    When(starts_with, then=Value(0)),
+                    When(contains, then=Value(1)),
+                    default=Value(2),
+                ),
+                similarity=Case(
+                    When(contains, then=Value(1.0)),
+                    default=TrigramSimilarity('name', term),
+                ),
+            ).order_by('search_rank', '-similarity', 'name', 'id')
+        else:
+            queryset = self.filter(name__icontains=term).annotate(
+                search_rank=Case(
+                    When(starts_with, then=Value(0)),
+                    default=Value(1),
+                ),
+            ).order_by('search_rank', 'name', 'id')
+        if limit:
+            queryset = queryset[:limit]
+        return queryset
+
+
 class Ingredient(models.Model):
 
     name = models.CharField(
@@ -18,6 +72,8 @@ class Ingredient(models.Model):
         verbose_name='Единицы измерения',
     )
 
+    objects = IngredientQuerySet.as_manager()
+
     class Meta:
         ordering = ['-id']
         verbose_name = 'Ингредиент'
@@ -50,22 +106,86 @@ class Tag(models.Model):
         unique=True,
         verbose_name='slug',
     )
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        null=True,
+        editable=False,
+        verbose_name='Номер бита в Recipe.tags_mask',
+    )
 
     class Meta:
         ordering = ['-id']
         verbose_name = 'Тег'
         verbose_name_plural = 'Теги'
 
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = self.get_free_bit()
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def get_free_bit(cls):
+        """
+        Наименьший свободный бит маски или None, если все
+        TAGS_MASK_BITS бит заняты: такой тег фильтруется через EXISTS.
+        """
+        used = set(cls.objects.filter(bit__isnull=False).values_list(
+            'bit', flat=True
+        ))
+        return next(
+            (bit for bit in range(TAGS_MASK_BITS) if bit not in used),
+            None,
+        )
+
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """
+        Подгружает всё, что нужно RecipeSerializer, фиксированным
+        числом запросов вне зависимости от размера страницы.
+        """
+        if user.is_authenticated:
+            is_favorited = Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+            is_in_shopping_cart = Exists(
+                Cart.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+            is_subscribed = Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            )
+        else:
+            is_favorited = is_in_shopping_cart = is_subscribed = Value(
+                False, output_field=models.BooleanField()
+            )
+        return self.annotate(
+            is_favorited=is_favorited,
+            is_in_shopping_cart=is_in_shopping_cart,
+        ).prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate(is_subscribed=is_subscribed),
+            ),
+            'tags',
+            Prefetch(
+                'ingredientamountforrecipe_set',
+                queryset=IngredientAmountForRecipe.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='recipes',
         verbose_name='Автор',
+        db_index=False,
     )
     name = models.CharField(
         max_length=200,
@@ -74,7 +194,9 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Фото',
         upload_to='recipes/',
+        storage=get_recipe_image_storage,
         blank=False,
+        db_index=True,
     )
     text = models.TextField(
         verbose_name='Описание'
@@ -100,6 +222,29 @@ class Recipe(models.Model):
     )
 
     slug = models.SlugField(null=True)
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество добавлений в избранное',
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество добавлений в корзину',
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения',
+    )
+    tags_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Битовая маска тегов',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
@@ -109,6 +254,10 @@ class Recipe(models.Model):
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['author', '-id'],
+                         name='recipe_author_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -154,6 +303,7 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name='favorites',
         verbose_name='Пользователь',
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -161,11 +311,20 @@ class Favorite(models.Model):
         related_name='favorites',
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         ordering = ['-id']
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='favorite_user_id_idx'),
+        ]
         constraints = [
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='unique favorite recipe for user')
@@ -178,6 +337,7 @@ class Cart(models.Model):
         on_delete=models.CASCADE,
         related_name='carts',
         verbose_name='Пользователь',
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -185,12 +345,86 @@ class Cart(models.Model):
         related_name='carts',
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         ordering = ['-id']
         verbose_name = 'Корзина'
         verbose_name_plural = 'В корзине'
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='cart_user_id_idx'),
+        ]
         constraints = [
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='unique cart user')
         ]
+
+
+class RecipeScore(models.Model):
+    """
+    Предрассчитанные оценки для сортировок popular и trending.
+    Обновляются командой refresh_recipe_scores.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт',
+    )
+    popular = models.FloatField(
+        default=0,
+        verbose_name='Популярность',
+    )
+    trending = models.FloatField(
+        default=0,
+        verbose_name='Популярность за последние дни',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата пересчёта',
+    )
+
+    class Meta:
+        verbose_name = 'Оценка рецепта'
+        verbose_name_plural = 'Оценки рецептов'
+        indexes = [
+            models.Index(fields=['-popular', '-recipe'],
+                         name='recipe_score_popular_idx'),
+            models.Index(fields=['-trending', '-recipe'],
+                         name='recipe_score_trending_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.recipe)
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество',
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique shopping list ingredient')
+        ]
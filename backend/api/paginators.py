@@ -1,6 +1,120 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+COUNT_MODES = ('exact', 'cached', 'estimated')
+COUNT_KEY = 'api:count:{}'
+
+
+class CountPaginator(Paginator):
+    """
+    Paginator, который считает общее число объектов в режиме
+    settings.PAGINATION_COUNT_MODE:
+
+    - exact: COUNT(*) на каждый запрос;
+    - cached: результат COUNT(*) кэшируется по тексту запроса и его
+      параметрам на PAGINATION_COUNT_CACHE_TIMEOUT секунд;
+    - estimated: для запроса без фильтров к PostgreSQL берётся оценка
+      pg_class.reltuples, если она не меньше
+      PAGINATION_COUNT_ESTIMATE_THRESHOLD, иначе как cached.
+    """
+
+    @cached_property
+    def count(self):
+        mode = settings.PAGINATION_COUNT_MODE
+        if mode not in COUNT_MODES:
+            raise ValueError(
+                f'Неизвестный PAGINATION_COUNT_MODE: {mode}'
+            )
+        if mode == 'exact' or not hasattr(self.object_list, 'query'):
+            return self.exact_count()
+        if mode == 'estimated':
+            estimate = self.estimate_count()
+            if estimate is not None:
+                return estimate
+        return self.cached_count()
+
+    def exact_count(self):
+        return super().count
+
+    def cached_count(self):
+        # Аннотации и сортировка на число строк не влияют, а аннотации
+        # зависят от пользователя, поэтому в ключ они не попадают.
+        queryset = self.object_list.order_by().values('pk')
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(
+            f'{queryset.db}:{sql}:{params!r}'.encode()
+        ).hexdigest()
+        return cache.get_or_set(
+            COUNT_KEY.format(digest),
+            self.exact_count,
+            settings.PAGINATION_COUNT_CACHE_TIMEOUT,
+        )
+
+    def estimate_count(self):
+        queryset = self.object_list
+        query = queryset.query
+        if query.where or query.distinct or query.group_by or (
+            query.low_mark or query.high_mark is not None
+        ):
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        threshold = settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+        if row is None or row[0] < threshold:
+            return None
+        return int(row[0])
+
+
+class CustomCursorPagination(CursorPagination):
+    """
+    Постраничный вывод по курсору: следующая страница выбирается
+    условием id < последнего id, без OFFSET и COUNT(*), поэтому
+    стоимость запроса не зависит от глубины.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
 
 
 class CustomPageNumberPagination(PageNumberPagination):
+    """
+    Обычная постраничная навигация (?page=) с ответом
+    count/next/previous/results.
+
+    Если в запросе есть параметр ?cursor= (в том числе пустой — первая
+    страница), разбивка передаётся в cursor_pagination_class, а ответ
+    содержит только next/previous/results. Порядок в этом режиме
+    всегда -id.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    django_paginator_class = CountPaginator
+    cursor_pagination_class = CustomCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
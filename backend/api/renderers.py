@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+
+    Строки списка отдаются по частям через stream(), чтобы view мог
+    вернуть StreamingHttpResponse, не собирая весь файл в памяти.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Ответы с ошибками (401, 404 и т.п.) отдаём как JSON.
+            return JSONRenderer().render(data)
+        return ''.join(self.stream(data)).encode(self.charset)
+
+    def stream(self, items):
+        raise NotImplementedError
+
+    def get_filename(self):
+        return f'shopping_list.{self.format}'
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, items):
+        for item in items:
+            yield (f'{item["name"]}: {item["amount"]} '
+                   f'{item["measurement_unit"]}\n')
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('name', 'amount', 'measurement_unit')
+
+    def stream(self, items):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.header)
+        for item in items:
+            writer.writerow([item[field] for field in self.header])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, items):
+        yield '['
+        separator = ''
+        for item in items:
+            yield separator + json.dumps(item, ensure_ascii=False)
+            separator = ','
+        yield ']'
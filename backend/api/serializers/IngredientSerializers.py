@@ -26,3 +26,10 @@ class IngredientAmountForRecipeSerializer(serializers.ModelSerializer):
                 fields=['ingredient', 'recipe']
             )
         ]
+
+
+class ShoppingCartIngredientSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source='ingredient_id')
+    name = serializers.CharField()
+    measurement_unit = serializers.CharField()
+    amount = serializers.IntegerField()
@@ -1,14 +1,31 @@
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
 from rest_framework import serializers
 
-from api.models import Ingredient, IngredientAmountForRecipe, Recipe
+from api.fields import StreamedBase64ImageField
+from api.models import Ingredient, IngredientAmountForRecipe, Recipe, Tag
 from api.serializers import IngredientAmountForRecipeSerializer, TagSerializer
+from api.services import (get_image_variant_url, get_image_variant_urls,
+                          update_recipe_in_shopping_lists)
 from users.serializers import CustomUserSerializer
 
+BULK_RECIPES_LIMIT = 100
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def add_error(errors, field, message):
+    messages = errors.setdefault(field, [])
+    if message not in messages:
+        messages.append(message)
+
 
 class RecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = StreamedBase64ImageField()
     tags = TagSerializer(read_only=True, many=True)
     author = CustomUserSerializer(read_only=True)
     ingredients = IngredientAmountForRecipeSerializer(
@@ -18,14 +35,30 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
+                  'is_in_shopping_cart', 'name', 'image', 'images', 'text',
                   'cooking_time')
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # В списках отдаём уменьшенную копию (context['image_variant']).
+        variant = self.context.get('image_variant')
+        if variant:
+            data['image'] = get_image_variant_url(
+                instance, variant, self.context.get('request')
+            )
+        return data
+
+    def get_images(self, obj):
+        return get_image_variant_urls(obj, self.context.get('request'))
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_authenticated:
             return Recipe.objects.filter(
@@ -35,6 +68,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_authenticated:
             return Recipe.objects.filter(
@@ -47,32 +82,68 @@ class RecipeSerializer(serializers.ModelSerializer):
         self.check_required_field('ingredients')
         self.check_required_field('tags')
 
-        ingredients = self.initial_data.get('ingredients')
-        ingredient_list = []
-        for ingredient in ingredients:
-            ingredient_item = get_object_or_404(
-                Ingredient,
-                id=ingredient['id']
-            )
-            if ingredient_item in ingredient_list:
-                raise serializers.ValidationError(
-                    {
-                        ingredient_item.name: f'{ingredient_item.name} '
-                                              f'указано несколько раз'
-                    }
-                )
-            ingredient_list.append(ingredient_item)
-            if int(ingredient['amount']) <= 0:
-                raise serializers.ValidationError(
-                    {
-                        ingredient_item.name: f'Количество '
-                                              f'{ingredient_item.name} '
-                                              f'должно быть больше 0'
-                    }
-                )
-        data['ingredients'] = ingredients
+        errors = {}
+        data['ingredients'] = self.validate_ingredients_data(
+            self.initial_data.get('ingredients'), errors
+        )
+        data['tags'] = self.validate_tags_data(
+            self.initial_data.get('tags'), errors
+        )
+        if errors:
+            raise serializers.ValidationError(errors)
         return data
 
+    def validate_ingredients_data(self, ingredients, errors):
+        """
+        Проверяет все ингредиенты одним запросом in_bulk() и собирает
+        в errors ошибки по всем ингредиентам сразу.
+        """
+        items = [
+            (ingredient.get('id'), to_int(ingredient.get('amount')))
+            if isinstance(ingredient, dict) else (ingredient, None)
+            for ingredient in ingredients
+        ]
+        found = Ingredient.objects.only('name').in_bulk({
+            to_int(pk) for pk, _ in items if to_int(pk) is not None
+        })
+        validated = []
+        seen = set()
+        for pk, amount in items:
+            ingredient = found.get(to_int(pk))
+            if ingredient is None:
+                add_error(errors, 'ingredients',
+                          f'Ингредиент {pk} не найден')
+                continue
+            name = ingredient.name
+            if ingredient.pk in seen:
+                add_error(errors, name, f'{name} указано несколько раз')
+                continue
+            seen.add(ingredient.pk)
+            if amount is None or amount <= 0:
+                add_error(errors, name,
+                          f'Количество {name} должно быть больше 0')
+                continue
+            validated.append({'id': ingredient.pk, 'amount': amount})
+        return validated
+
+    def validate_tags_data(self, tags, errors):
+        # По БД, а не по кэшу тегов: кэш воркера может отставать.
+        existing = set(Tag.objects.filter(id__in={
+            pk for pk in map(to_int, tags) if pk is not None
+        }).values_list('id', flat=True))
+        validated = []
+        seen = set()
+        for tag in tags:
+            pk = to_int(tag)
+            if pk not in existing:
+                add_error(errors, 'tags', f'Тег {tag} не найден')
+            elif pk in seen:
+                add_error(errors, 'tags', f'Тег {tag} указан несколько раз')
+            else:
+                seen.add(pk)
+                validated.append(pk)
+        return validated
+
     def check_required_field(self, field):
         checking_field = self.initial_data.get(field)
         if not checking_field:
@@ -83,6 +154,8 @@ class RecipeSerializer(serializers.ModelSerializer):
             )
 
     def create_ingredients(self, ingredients, recipe):
+        if not ingredients:
+            return
         ingredients_list = []
         for ingredient in ingredients:
             ingredients_list.append(
@@ -97,34 +170,104 @@ class RecipeSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         image = validated_data.pop('image')
         ingredients_data = validated_data.pop('ingredients')
+        tags_data = validated_data.pop('tags')
         recipe = Recipe.objects.create(image=image, **validated_data)
-        tags_data = self.initial_data.get('tags')
         recipe.tags.set(tags_data)
         self.create_ingredients(ingredients_data, recipe)
         return recipe
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Временный файл загрузки хранилище перемещает, а не копирует;
+            # закрываем его явно, чтобы не остался открытый дескриптор.
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.image = validated_data.get('image', instance.image)
+        image = validated_data.get('image')
+        if image is not None:
+            instance.image.save(image.name, image, save=False)
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time
         )
-        instance.tags.clear()
-        tags_data = self.initial_data.get('tags')
-        instance.tags.set(tags_data)
-        IngredientAmountForRecipe.objects.filter(
-            recipe=instance
-        ).all().delete()
-        self.create_ingredients(validated_data.get('ingredients'), instance)
-        instance.save()
+        instance.tags.set(validated_data.get('tags'))
+        self.update_ingredients(validated_data.get('ingredients'), instance)
+        # Только редактируемые поля: счётчики меняются параллельно через
+        # F(), а image_variants пишет фоновая задача. Варианты новой
+        # картинки и удаление прежней - в сигналах сохранения Recipe.
+        update_fields = ['name', 'slug', 'text', 'cooking_time']
+        if image is not None:
+            update_fields.append('image')
+        instance.save(update_fields=update_fields)
         return instance
 
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Меняет состав рецепта по разнице со старым: добавляет новые
+        ингредиенты, обновляет изменившиеся количества и удаляет
+        убранные, не трогая остальные строки.
+        """
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        rows = {
+            row.ingredient_id: row
+            for row in IngredientAmountForRecipe.objects.filter(recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in rows.items()
+        }
+        removed = old_amounts.keys() - new_amounts.keys()
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            row = rows.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if removed:
+            IngredientAmountForRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        if changed:
+            IngredientAmountForRecipe.objects.bulk_update(changed, ['amount'])
+        self.create_ingredients(
+            [
+                ingredient for ingredient in ingredients
+                if ingredient['id'] not in rows
+            ],
+            recipe,
+        )
+        update_recipe_in_shopping_lists(recipe, old_amounts, new_amounts)
+
 
 class MiniRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = serializers.SerializerMethodField()
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
-        read_only_fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
+        read_only_fields = ('id', 'name', 'image', 'images', 'cooking_time')
+
+    def get_image(self, obj):
+        return get_image_variant_url(
+            obj, 'thumbnail', self.context.get('request')
+        )
+
+    def get_images(self, obj):
+        return get_image_variant_urls(obj, self.context.get('request'))
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_LIMIT,
+    )
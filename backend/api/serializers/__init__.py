@@ -1,7 +1,13 @@
-from .IngredientSerializers import (IngredientSerializer,
-                                    IngredientAmountForRecipeSerializer)
+# isort: off
+# RecipeSerializers последним: он импортирует из этого пакета
+# IngredientAmountForRecipeSerializer и TagSerializer.
+from .IngredientSerializers import (IngredientAmountForRecipeSerializer,
+                                    IngredientSerializer,
+                                    ShoppingCartIngredientSerializer)
 from .TagSerializers import TagSerializer
-from .RecipeSerializers import RecipeSerializer, MiniRecipeSerializer
+from .RecipeSerializers import (MiniRecipeSerializer, RecipeIdsSerializer,
+                                RecipeSerializer)
+# isort: on
 
 __all__ = [
     'IngredientSerializer',
@@ -9,4 +15,6 @@ __all__ = [
     'RecipeSerializer',
     'IngredientAmountForRecipeSerializer',
     'MiniRecipeSerializer',
+    'RecipeIdsSerializer',
+    'ShoppingCartIngredientSerializer',
 ]
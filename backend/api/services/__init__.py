@@ -0,0 +1,64 @@
+from .bonds import delete_recipe_bonds, insert_recipe_bonds
+from .counters import (change_counter, change_followers_count,
+                       change_recipes_count, recount_counters)
+from .ingredient_loader import (copy_is_available, load_ingredients,
+                                load_ingredients_copy, load_ingredients_orm,
+                                read_ingredients)
+from .recipe_images import (generate_image_variants, get_image_variant_url,
+                            get_image_variant_urls, get_referenced_image_names,
+                            release_recipe_image, schedule_image_variants)
+from .recipe_scores import (calculate_trending_scores,
+                            create_missing_recipe_scores,
+                            refresh_recipe_scores)
+from .shopping_list import (add_recipe_to_shopping_list,
+                            add_recipes_to_shopping_list,
+                            apply_shopping_list_changes,
+                            calculate_shopping_lists, get_recipes_amounts,
+                            get_shopping_list, get_stored_shopping_lists,
+                            rebuild_shopping_lists,
+                            remove_recipe_from_shopping_list,
+                            remove_recipes_from_shopping_list,
+                            update_recipe_in_shopping_lists)
+from .tags import (clear_tag_bit, get_tag_bits_by_slug, get_tag_ids_by_slug,
+                   get_tags_mask, set_tag_bit, update_tags_mask, with_tag_bit)
+
+__all__ = [
+    'delete_recipe_bonds',
+    'insert_recipe_bonds',
+    'change_counter',
+    'change_followers_count',
+    'change_recipes_count',
+    'recount_counters',
+    'copy_is_available',
+    'load_ingredients',
+    'load_ingredients_copy',
+    'load_ingredients_orm',
+    'read_ingredients',
+    'generate_image_variants',
+    'get_image_variant_url',
+    'get_image_variant_urls',
+    'get_referenced_image_names',
+    'release_recipe_image',
+    'schedule_image_variants',
+    'calculate_trending_scores',
+    'create_missing_recipe_scores',
+    'refresh_recipe_scores',
+    'add_recipe_to_shopping_list',
+    'add_recipes_to_shopping_list',
+    'apply_shopping_list_changes',
+    'calculate_shopping_lists',
+    'get_recipes_amounts',
+    'get_shopping_list',
+    'get_stored_shopping_lists',
+    'rebuild_shopping_lists',
+    'remove_recipe_from_shopping_list',
+    'remove_recipes_from_shopping_list',
+    'update_recipe_in_shopping_lists',
+    'clear_tag_bit',
+    'get_tag_bits_by_slug',
+    'get_tag_ids_by_slug',
+    'get_tags_mask',
+    'set_tag_bit',
+    'update_tags_mask',
+    'with_tag_bit',
+]
@@ -0,0 +1,66 @@
+from django.db import connection
+from django.utils import timezone
+
+
+def get_columns(model, *names):
+    return [
+        connection.ops.quote_name(model._meta.get_field(name).column)
+        for name in names
+    ]
+
+
+def insert_recipe_bonds(model, user, recipe_ids):
+    """
+    Связывает пользователя с рецептами recipe_ids (Favorite, Cart)
+    одним INSERT ... ON CONFLICT DO NOTHING RETURNING и возвращает id
+    рецептов, связи с которыми вставил именно этот запрос. Уже
+    существующие, в том числе только что добавленные параллельным
+    запросом, в результат не попадают, поэтому счётчики и списки
+    покупок меняются ровно один раз.
+    """
+    if not recipe_ids:
+        return set()
+    user_column, recipe_column, created_column = get_columns(
+        model, 'user', 'recipe', 'created'
+    )
+    created = model._meta.get_field('created').get_db_prep_value(
+        timezone.now(), connection
+    )
+    values = ', '.join(['(%s, %s, %s)'] * len(recipe_ids))
+    # Один порядок вставки во всех запросах: параллельные вставки
+    # пересекающихся наборов не ждут друг друга крест-накрест.
+    params = [
+        value for pk in sorted(recipe_ids)
+        for value in (user.pk, pk, created)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} '
+            f'({user_column}, {recipe_column}, {created_column}) '
+            f'VALUES {values} ON CONFLICT DO NOTHING '
+            f'RETURNING {recipe_column}',
+            params,
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def delete_recipe_bonds(model, user, recipe_ids):
+    """
+    Удаляет связи пользователя с рецептами одним DELETE ... RETURNING
+    и возвращает id рецептов, связи с которыми удалил этот запрос.
+    Сигналы удаления при этом не отправляются: изменения счётчиков и
+    списка покупок вызывающий код применяет сам.
+    """
+    if not recipe_ids:
+        return set()
+    user_column, recipe_column = get_columns(model, 'user', 'recipe')
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+            f'WHERE {user_column} = %s '
+            f'AND {recipe_column} IN ({placeholders}) '
+            f'RETURNING {recipe_column}',
+            [user.pk, *recipe_ids],
+        )
+        return {row[0] for row in cursor.fetchall()}
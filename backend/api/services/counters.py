@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from api.models import Cart, Favorite, Recipe
+from users.models import Follow, Profile
+
+User = get_user_model()
+
+
+def change_counter(queryset, field, delta):
+    """
+    Меняет счётчик field на delta одним UPDATE с F(), без чтения
+    строки, поэтому параллельные запросы не теряют изменений.
+    """
+    queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def change_recipes_count(author, delta):
+    change_counter(
+        Profile.objects.filter(user=author), 'recipes_count', delta
+    )
+
+
+def change_followers_count(author, delta):
+    change_counter(
+        Profile.objects.filter(user=author), 'followers_count', delta
+    )
+
+
+def count_related(model, field, outer_field='pk'):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef(outer_field)}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+def recount_counters():
+    """
+    Пересчитывает все денормализованные счётчики по исходным таблицам
+    и создаёт недостающие профили пользователей.
+    """
+    with transaction.atomic():
+        Profile.objects.bulk_create(
+            Profile(user_id=user_id)
+            for user_id in User.objects.filter(
+                profile__isnull=True
+            ).values_list('pk', flat=True)
+        )
+        profiles = Profile.objects.update(
+            recipes_count=count_related(Recipe, 'author', 'user'),
+            followers_count=count_related(Follow, 'author', 'user'),
+        )
+        recipes = Recipe.objects.update(
+            favorites_count=count_related(Favorite, 'recipe'),
+            carts_count=count_related(Cart, 'recipe'),
+        )
+    return profiles, recipes
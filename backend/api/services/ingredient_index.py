@@ -0,0 +1,81 @@
+import threading
+from bisect import bisect_left
+
+from django.db import connection
+
+from api.models import INGREDIENT_SUBSTRING_SEARCH_MIN_LENGTH, Ingredient
+from api.versions import INGREDIENTS_VERSION, get_version
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти воркера для автодополнения.
+
+    Загружается при первом поиске и перезагружается, когда меняется
+    версия ингредиентов в кэше (её увеличивают сигналы модели).
+    Возвращает ту же выдачу и в том же порядке, что и
+    Ingredient.objects.autocomplete(): список загружается отсортированным
+    самой БД, поэтому порядок следует её правилам сравнения строк
+    (collation), а не кодам символов.
+
+    Между процессами версия передаётся через кэш, поэтому при
+    нескольких воркерах он должен быть общим (settings.CACHE_IS_SHARED).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        # Неизменяемый снимок (ingredients, prefix_keys): ингредиенты в
+        # порядке выдачи (name, id) и пары (НАЗВАНИЕ, позиция в
+        # ingredients) для bisect. Публикуется одним присваиванием,
+        # поэтому поиск без блокировки не увидит половину перезагрузки.
+        self.snapshot = ((), ())
+
+    def load(self, version):
+        ingredients = list(Ingredient.objects.order_by('name', 'id'))
+        prefix_keys = sorted(
+            (ingredient.name.upper(), position)
+            for position, ingredient in enumerate(ingredients)
+        )
+        self.snapshot = (tuple(ingredients), tuple(prefix_keys))
+        self.version = version
+
+    def ensure_loaded(self):
+        version = get_version(INGREDIENTS_VERSION)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.load(version)
+
+    def search(self, term, limit=None):
+        """
+        Возвращает список ингредиентов или None, если выдачу нельзя
+        собрать без БД: в PostgreSQL к неполной выдаче добавляются
+        нечёткие совпадения по триграммам.
+        """
+        self.ensure_loaded()
+        ingredients, prefix_keys = self.snapshot
+        key = term.upper()
+        positions = []
+        index = bisect_left(prefix_keys, (key,))
+        while (index < len(prefix_keys)
+               and prefix_keys[index][0].startswith(key)):
+            positions.append(prefix_keys[index][1])
+            index += 1
+        result = [ingredients[position] for position in sorted(positions)]
+        if len(term) >= INGREDIENT_SUBSTRING_SEARCH_MIN_LENGTH:
+            result.extend(
+                ingredient for ingredient in ingredients
+                if key in ingredient.name.upper()
+                and not ingredient.name.upper().startswith(key)
+            )
+        if limit:
+            result = result[:limit]
+        if (len(term) >= INGREDIENT_SUBSTRING_SEARCH_MIN_LENGTH
+                and connection.vendor == 'postgresql'
+                and (not limit or len(result) < limit)):
+            return None
+        return result
+
+
+ingredient_index = IngredientIndex()
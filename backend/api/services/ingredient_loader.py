@@ -0,0 +1,124 @@
+import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.db import connection, transaction
+
+from api.models import Ingredient
+from api.versions import INGREDIENTS_VERSION, bump_version
+
+
+def read_ingredients(path):
+    """
+    Построчно читает каталог ингредиентов из CSV (name,measurement_unit)
+    или JSON (список объектов с полями name и measurement_unit).
+    """
+    path = Path(path)
+    if path.suffix == '.json':
+        with open(path, encoding='utf-8') as json_file:
+            for item in json.load(json_file):
+                yield item['name'].strip(), item['measurement_unit'].strip()
+        return
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        for row in csv.reader(csv_file):
+            if row:
+                yield row[0].strip(), row[1].strip()
+
+
+def load_ingredients_orm(rows, batch_size=1000):
+    """
+    Добавляет ингредиенты пачками через bulk_create. Уже существующие
+    пары (name, measurement_unit) пропускаются, ничего не удаляется.
+    Возвращает количество прочитанных строк.
+    """
+    rows = iter(rows)
+    total = 0
+    with transaction.atomic():
+        while True:
+            batch = [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in islice(rows, batch_size)
+            ]
+            if not batch:
+                break
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+    return total
+
+
+class RowsFile:
+    """
+    Файлоподобная обёртка над итератором строк для cursor.copy_expert:
+    отдаёт CSV кусками по мере чтения, не собирая файл в памяти.
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.count = 0
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def read(self, size=-1):
+        position = self.buffer.tell()
+        while size < 0 or position < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.count += 1
+            position = self.buffer.tell()
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+
+def copy_is_available():
+    return connection.vendor == 'postgresql'
+
+
+def load_ingredients_copy(rows):
+    """
+    Загружает ингредиенты через COPY FROM STDIN во временную таблицу
+    и переносит новые строки в таблицу ингредиентов одним INSERT.
+    Работает только на PostgreSQL.
+    """
+    table = Ingredient._meta.db_table
+    rows_file = RowsFile(rows)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE ingredient_staging '
+            '(name varchar(200), measurement_unit varchar(200)) '
+            'ON COMMIT DROP'
+        )
+        cursor.copy_expert(
+            'COPY ingredient_staging (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)',
+            rows_file,
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            f'SELECT DISTINCT name, measurement_unit FROM ingredient_staging '
+            f'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+    return rows_file.count
+
+
+def load_ingredients(rows, method='auto', batch_size=1000):
+    """
+    Загружает ингредиенты выбранным способом: copy, orm или auto
+    (COPY на PostgreSQL, bulk_create на остальных БД).
+    """
+    if method == 'auto':
+        method = 'copy' if copy_is_available() else 'orm'
+    if method == 'copy':
+        if not copy_is_available():
+            raise ValueError('COPY поддерживается только в PostgreSQL')
+        total = load_ingredients_copy(rows)
+    else:
+        total = load_ingredients_orm(rows, batch_size=batch_size)
+    # Массовая вставка не вызывает сигналы модели.
+    bump_version(INGREDIENTS_VERSION)
+    return total
@@ -0,0 +1,253 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from api.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Ширины уменьшенных копий в пикселях.
+IMAGE_WIDTHS = (150, 480, 1280)
+# Именованные варианты для поля image: имя -> ширина.
+IMAGE_VARIANTS = {
+    'thumbnail': 150,
+    'card': 480,
+    'full': 1280,
+}
+# Формат -> (формат Pillow, расширение, параметры сохранения), от более
+# компактного к JPEG, который понимают все клиенты.
+IMAGE_FORMATS = {
+    'avif': ('AVIF', 'avif', {'quality': 60}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', 'jpg', {
+        'quality': 85, 'optimize': True, 'progressive': True,
+    }),
+}
+FALLBACK_FORMAT = 'jpeg'
+VARIANTS_DIR = 'recipes/variants'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_image_formats():
+    """Форматы, которые умеет сохранять установленный Pillow."""
+    return {
+        image_format: options
+        for image_format, options in IMAGE_FORMATS.items()
+        if image_format == FALLBACK_FORMAT or features.check(image_format)
+    }
+
+
+def get_variant_name(image_name, width, extension):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{VARIANTS_DIR}/{stem}_{width}.{extension}'
+
+
+def get_variant_widths(width):
+    # Картинки не увеличиваются: ширины больше исходной заменяются ей.
+    return sorted({
+        min(variant_width, width) for variant_width in IMAGE_WIDTHS
+    })
+
+
+def build_image_variants(image_name, storage):
+    """
+    Сохраняет уменьшенные копии изображения во всех форматах из
+    get_image_formats() и возвращает словарь
+    {формат: {ширина: имя файла}}; ширины - строки, как их хранит JSON.
+    Имена вариантов строятся от имени оригинала, поэтому для
+    одинаковых оригиналов варианты общие.
+    """
+    with storage.open(image_name) as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        names = {
+            image_format: {
+                str(width): get_variant_name(image_name, width, extension)
+                for width in get_variant_widths(image.width)
+            }
+            for image_format, (_, extension, _) in get_image_formats().items()
+        }
+        if all(
+            storage.exists(name)
+            for widths in names.values() for name in widths.values()
+        ):
+            # Та же картинка уже загружалась в другой рецепт.
+            return names
+        image = image.convert('RGB')
+        variants = {}
+        for image_format, widths in names.items():
+            pillow_format, _, options = IMAGE_FORMATS[image_format]
+            variants[image_format] = {}
+            for width, name in widths.items():
+                resized = image.copy()
+                resized.thumbnail((int(width), image.height))
+                buffer = BytesIO()
+                resized.save(buffer, pillow_format, **options)
+                variants[image_format][width] = storage.save_as(
+                    name, ContentFile(buffer.getvalue())
+                )
+    return variants
+
+
+def generate_image_variants(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return None
+    if not recipe.image.storage.exists(recipe.image.name):
+        # Файл удалён или рецепт сослался на несуществующее имя.
+        return None
+    variants = build_image_variants(recipe.image.name, recipe.image.storage)
+    # Если изображение успели заменить, результат уже не нужен.
+    Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).update(
+        image_variants=variants
+    )
+    return variants
+
+
+def get_image_file_names(variants):
+    """
+    Имена файлов вариантов. Понимает и прежний формат
+    {вариант: имя файла}, пока не выполнен refresh_image_variants --all.
+    """
+    names = set()
+    for value in variants.values():
+        if isinstance(value, dict):
+            names.update(value.values())
+        else:
+            names.add(value)
+    return names
+
+
+def release_recipe_image(name, variants):
+    """
+    Удаляет файл изображения и его варианты, если на файл больше не
+    ссылается ни один рецепт. Одинаковые картинки хранятся одним
+    файлом, а имена вариантов производны от имени оригинала, поэтому
+    достаточно посчитать ссылки на оригинал (по индексу Recipe.image).
+    Проверка выполняется после коммита транзакции.
+
+    Файл моложе RECIPE_IMAGE_RELEASE_MIN_AGE секунд не удаляется: его
+    мог только что записать запрос, который ещё не закоммитил ссылку.
+    Такие файлы без ссылок потом удаляет collect_media_garbage.
+    """
+    if not name:
+        return
+
+    def release():
+        if Recipe.objects.filter(image=name).exists():
+            return
+        storage = Recipe._meta.get_field('image').storage
+        try:
+            modified = storage.get_modified_time(name)
+        except FileNotFoundError:
+            modified = None
+        min_age = timedelta(seconds=settings.RECIPE_IMAGE_RELEASE_MIN_AGE)
+        if modified is not None and timezone.now() - modified < min_age:
+            return
+        for file_name in {name, *get_image_file_names(variants)}:
+            storage.delete(file_name)
+
+    transaction.on_commit(release)
+
+
+def get_referenced_image_names():
+    """Имена всех файлов, на которые ссылаются рецепты."""
+    names = set()
+    for image, variants in Recipe.objects.values_list(
+        'image', 'image_variants'
+    ).iterator():
+        names.add(image)
+        names.update(get_image_file_names(variants))
+    return names
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+    return _executor
+
+
+def run_image_variants_job(recipe_id):
+    try:
+        generate_image_variants(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось построить варианты изображения рецепта %s',
+            recipe_id,
+        )
+    finally:
+        connections.close_all()
+
+
+def schedule_image_variants(recipe):
+    """
+    Ставит построение вариантов изображения в очередь пула потоков
+    после коммита транзакции. С RECIPE_IMAGE_VARIANTS_SYNC варианты
+    строятся сразу (для тестов и отладки).
+    """
+    if settings.RECIPE_IMAGE_VARIANTS_SYNC:
+        generate_image_variants(recipe.pk)
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(run_image_variants_job, recipe.pk)
+    )
+
+
+def get_image_url(name, storage, request=None):
+    url = storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def get_image_variant_url(recipe, variant, request=None):
+    """
+    URL JPEG-варианта не шире IMAGE_VARIANTS[variant] (или самого
+    маленького), либо исходного изображения, пока вариантов нет.
+    """
+    if not recipe.image:
+        return None
+    name = recipe.image.name
+    widths = recipe.image_variants.get(FALLBACK_FORMAT)
+    if isinstance(widths, dict) and widths:
+        fitting = [
+            width for width in sorted(widths, key=int)
+            if int(width) <= IMAGE_VARIANTS[variant]
+        ]
+        name = widths[fitting[-1] if fitting else min(widths, key=int)]
+    return get_image_url(name, recipe.image.storage, request)
+
+
+def get_image_variant_urls(recipe, request=None):
+    """
+    URL всех вариантов: {формат: {ширина: URL}}, форматы от более
+    компактного к JPEG. Пустой словарь, пока варианты не построены.
+    """
+    if not recipe.image:
+        return {}
+    storage = recipe.image.storage
+    return {
+        image_format: {
+            width: get_image_url(name, storage, request)
+            for width, name in sorted(
+                widths.items(), key=lambda item: int(item[0])
+            )
+        }
+        for image_format, widths in recipe.image_variants.items()
+        if isinstance(widths, dict)
+    }
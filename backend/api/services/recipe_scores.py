@@ -0,0 +1,84 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import Cart, Favorite, Recipe, RecipeScore
+
+FAVORITE_WEIGHT = 1.0
+CART_WEIGHT = 2.0
+TRENDING_WINDOW = timedelta(days=7)
+TRENDING_HALF_LIFE = timedelta(days=1)
+
+
+def calculate_trending_scores(now=None, window=TRENDING_WINDOW,
+                              half_life=TRENDING_HALF_LIFE):
+    """
+    Сумма добавлений в избранное и корзину за последние window, где
+    вес каждого добавления убывает вдвое каждые half_life.
+    """
+    now = now or timezone.now()
+    scores = defaultdict(float)
+    for model, weight in ((Favorite, FAVORITE_WEIGHT),
+                          (Cart, CART_WEIGHT)):
+        events = model.objects.filter(
+            created__gte=now - window
+        ).values_list('recipe_id', 'created').order_by()
+        for recipe_id, created in events.iterator():
+            scores[recipe_id] += weight * 0.5 ** (
+                (now - created) / half_life
+            )
+    return scores
+
+
+def refresh_recipe_scores(now=None, window=TRENDING_WINDOW,
+                          half_life=TRENDING_HALF_LIFE, batch_size=1000):
+    """
+    Пересчитывает таблицу RecipeScore для всех рецептов.
+
+    popular считается по денормализованным счётчикам, trending — по
+    добавлениям за последние дни с затуханием по времени. Строки
+    обновляются на месте, а не пересоздаются: иначе вставка вступает
+    в конфликт со строкой, которую сигнал создаёт новому рецепту.
+    """
+    trending = calculate_trending_scores(now, window, half_life)
+    recipes = Recipe.objects.values_list(
+        'pk', 'favorites_count', 'carts_count'
+    ).order_by()
+    updated = timezone.now()
+    scores = (
+        RecipeScore(
+            recipe_id=pk,
+            popular=(favorites_count * FAVORITE_WEIGHT
+                     + carts_count * CART_WEIGHT),
+            trending=trending.get(pk, 0),
+            updated=updated,
+        )
+        for pk, favorites_count, carts_count in recipes.iterator()
+    )
+    with transaction.atomic():
+        create_missing_recipe_scores(batch_size)
+        for batch in iter(lambda: list(islice(scores, batch_size)), []):
+            RecipeScore.objects.bulk_update(
+                batch, ['popular', 'trending', 'updated']
+            )
+        return RecipeScore.objects.count()
+
+
+def create_missing_recipe_scores(batch_size=1000):
+    """
+    Создаёт нулевые оценки рецептам без строки RecipeScore: сортировки
+    popular и trending идут через INNER JOIN и без неё рецепт не покажут.
+    """
+    RecipeScore.objects.bulk_create(
+        (
+            RecipeScore(recipe_id=pk)
+            for pk in Recipe.objects.filter(
+                score__isnull=True
+            ).values_list('pk', flat=True).iterator()
+        ),
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,163 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Sum
+
+from api.models import Cart, IngredientAmountForRecipe, ShoppingListItem
+
+User = get_user_model()
+
+
+def get_shopping_list(user):
+    """
+    Список покупок пользователя из денормализованной таблицы
+    ShoppingListItem: чтение по индексу, без агрегации по корзине.
+    """
+    return user.shopping_list.values(
+        'ingredient_id',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+        amount=F('total_amount'),
+    ).order_by('name', 'ingredient_id')
+
+
+def apply_shopping_list_changes(user_ids, deltas):
+    """
+    Прибавляет к спискам покупок пользователей user_ids изменения
+    deltas вида {ingredient_id: amount}. Позиции с нулевым остатком
+    удаляются.
+
+    Строки пользователей блокируются до конца транзакции (по
+    возрастанию pk, чтобы не было взаимоблокировок): иначе два
+    параллельных запроса одного пользователя могут оба не найти
+    позицию и вставить её дважды.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(
+            pk__in=user_ids
+        ).order_by('pk').values_list('pk', flat=True))
+        items = ShoppingListItem.objects.filter(
+            user_id__in=user_ids,
+            ingredient_id__in=deltas,
+        )
+        existing = {
+            (item.user_id, item.ingredient_id): item for item in items
+        }
+        to_create, to_update, to_delete = [], [], []
+        for user_id in user_ids:
+            for ingredient_id, delta in deltas.items():
+                item = existing.get((user_id, ingredient_id))
+                if item is None:
+                    if delta > 0:
+                        to_create.append(ShoppingListItem(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            total_amount=delta,
+                        ))
+                elif item.total_amount + delta > 0:
+                    item.total_amount += delta
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.pk)
+        ShoppingListItem.objects.bulk_create(to_create)
+        ShoppingListItem.objects.bulk_update(to_update, ['total_amount'])
+        ShoppingListItem.objects.filter(pk__in=to_delete).delete()
+
+
+def get_recipes_amounts(recipe_ids):
+    """Суммарные количества ингредиентов нескольких рецептов."""
+    return Counter(dict(
+        IngredientAmountForRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('ingredient_id').annotate(
+            total=Sum('amount')
+        ).order_by().values_list('ingredient_id', 'total')
+    ))
+
+
+def add_recipes_to_shopping_list(user, recipe_ids):
+    apply_shopping_list_changes([user.id], get_recipes_amounts(recipe_ids))
+
+
+def remove_recipes_from_shopping_list(user, recipe_ids):
+    deltas = {
+        ingredient_id: -amount
+        for ingredient_id, amount
+        in get_recipes_amounts(recipe_ids).items()
+    }
+    apply_shopping_list_changes([user.id], deltas)
+
+
+def add_recipe_to_shopping_list(user, recipe):
+    add_recipes_to_shopping_list(user, [recipe.pk])
+
+
+def remove_recipe_from_shopping_list(user, recipe):
+    remove_recipes_from_shopping_list(user, [recipe.pk])
+
+
+def update_recipe_in_shopping_lists(recipe, old_amounts, new_amounts):
+    """
+    Переносит изменение состава рецепта в списки покупок всех
+    пользователей, у которых рецепт лежит в корзине.
+    """
+    deltas = Counter(new_amounts)
+    deltas.subtract(old_amounts)
+    if not any(deltas.values()):
+        return
+    user_ids = Cart.objects.filter(recipe=recipe).values_list(
+        'user_id', flat=True
+    )
+    apply_shopping_list_changes(user_ids, deltas)
+
+
+def calculate_shopping_lists():
+    """
+    Эталонные списки покупок всех пользователей, посчитанные заново
+    по корзинам: {(user_id, ingredient_id): amount}.
+    """
+    totals = IngredientAmountForRecipe.objects.filter(
+        recipe__carts__isnull=False
+    ).values(
+        'recipe__carts__user_id', 'ingredient_id'
+    ).annotate(amount=Sum('amount')).order_by()
+    return {
+        (item['recipe__carts__user_id'], item['ingredient_id']):
+            item['amount']
+        for item in totals.iterator()
+    }
+
+
+def get_stored_shopping_lists():
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount
+        in ShoppingListItem.objects.values_list(
+            'user_id', 'ingredient_id', 'total_amount'
+        ).iterator()
+    }
+
+
+def rebuild_shopping_lists(batch_size=1000):
+    with transaction.atomic():
+        ShoppingListItem.objects.all().delete()
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=amount,
+                )
+                for (user_id, ingredient_id), amount
+                in calculate_shopping_lists().items()
+            ),
+            batch_size=batch_size,
+        )
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from api.models import Recipe, Tag
+from api.versions import TAGS_VERSION, get_version
+
+TAG_IDS_KEY = 'api:tag_ids:{}'
+TAG_BITS_KEY = 'api:tag_bits:{}'
+
+
+def get_cached_tags(key, fields):
+    if not settings.CACHE_IS_SHARED:
+        # Версию в кэше другого процесса сигналы не обновят: такой кэш
+        # не узнал бы о новых тегах и отдавал бы удалённые.
+        return dict(Tag.objects.values_list(*fields))
+    return cache.get_or_set(
+        key.format(get_version(TAGS_VERSION).token),
+        lambda: dict(Tag.objects.values_list(*fields)),
+        settings.REFERENCE_DATA_CACHE_TIMEOUT,
+    )
+
+
+def get_tag_ids_by_slug():
+    """
+    Словарь {slug: id} всех тегов. С общим кэшем хранится до смены версии
+    TAGS_VERSION, поэтому фильтр по тегам не обращается к таблице тегов.
+    """
+    return get_cached_tags(TAG_IDS_KEY, ('slug', 'id'))
+
+
+def get_tag_bits_by_slug():
+    """Словарь {slug: bit}; bit равен None у тегов без места в маске."""
+    return get_cached_tags(TAG_BITS_KEY, ('slug', 'bit'))
+
+
+def get_tags_mask(bits):
+    mask = 0
+    for bit in bits:
+        mask |= 1 << bit
+    return mask
+
+
+def with_tag_bit(queryset, bit):
+    return queryset.alias(
+        tag_bit=F('tags_mask').bitand(1 << bit)
+    ).exclude(tag_bit=0)
+
+
+def update_tags_mask(recipe):
+    """Пересчитывает Recipe.tags_mask по текущим тегам рецепта."""
+    recipe.tags_mask = get_tags_mask(
+        recipe.tags.filter(bit__isnull=False).values_list('bit', flat=True)
+    )
+    Recipe.objects.filter(pk=recipe.pk).update(tags_mask=recipe.tags_mask)
+
+
+def set_tag_bit(tag, recipes):
+    if tag.bit is not None:
+        recipes.update(tags_mask=F('tags_mask').bitor(1 << tag.bit))
+
+
+def clear_tag_bit(tag, recipes):
+    if tag.bit is not None:
+        with_tag_bit(recipes, tag.bit).update(
+            tags_mask=F('tags_mask').bitand(~(1 << tag.bit))
+        )
@@ -0,0 +1,121 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from api.models import Cart, Ingredient, Recipe, RecipeScore, Tag
+from api.services import (add_recipe_to_shopping_list, change_recipes_count,
+                          clear_tag_bit, release_recipe_image,
+                          remove_recipe_from_shopping_list,
+                          schedule_image_variants, set_tag_bit,
+                          update_tags_mask)
+from api.versions import INGREDIENTS_VERSION, TAGS_VERSION, bump_version
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredients_changed(**kwargs):
+    bump_version(INGREDIENTS_VERSION)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tags_changed(**kwargs):
+    bump_version(TAGS_VERSION)
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(instance, **kwargs):
+    # Связи с рецептами удаляются каскадом без m2m_changed.
+    clear_tag_bit(instance, Recipe.objects.all())
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    """Поддерживает Recipe.tags_mask в соответствии с recipe.tags."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        update_tags_mask(instance)
+        return
+    recipes = Recipe.objects.all()
+    if action != 'post_clear':
+        recipes = recipes.filter(pk__in=pk_set)
+    if action == 'post_add':
+        set_tag_bit(instance, recipes)
+    else:
+        clear_tag_bit(instance, recipes)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    # У каждого рецепта есть оценка, см. RecipeFilter.filter_ordering.
+    if created:
+        RecipeScore.objects.create(recipe=instance)
+        change_recipes_count(instance.author_id, 1)
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_saving(instance, update_fields, **kwargs):
+    # Сохранённое изображение, чтобы recipe_image_saved заметил замену.
+    instance._stored_image = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    instance._stored_image = Recipe.objects.filter(
+        pk=instance.pk
+    ).values_list('image', 'image_variants').first()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(instance, created, **kwargs):
+    """
+    Строит варианты нового изображения и освобождает файлы прежнего,
+    откуда бы ни пришла замена: из API или из админки. Одинаковые
+    картинки хранятся одним файлом, поэтому загрузка той же картинки
+    ничего не меняет.
+    """
+    stored = instance.__dict__.pop('_stored_image', None)
+    if created:
+        if instance.image:
+            schedule_image_variants(instance)
+        return
+    if stored is None or stored[0] == instance.image.name:
+        return
+    old_image, old_variants = stored
+    # Варианты прежнего изображения к новому не относятся.
+    Recipe.objects.filter(pk=instance.pk).update(image_variants={})
+    instance.image_variants = {}
+    if instance.image:
+        schedule_image_variants(instance)
+    release_recipe_image(old_image, old_variants)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    # Счётчик меняется и при удалении из админки или каскадом;
+    # при удалении автора его профиль удаляется тем же каскадом.
+    change_recipes_count(instance.author_id, -1)
+    # Файл может быть общим с другими рецептами, см. release_recipe_image.
+    release_recipe_image(instance.image.name, instance.image_variants)
+
+
+@receiver(post_save, sender=Cart)
+def cart_created(instance, created, **kwargs):
+    """
+    Добавляет рецепт в список покупок при создании Cart через ORM,
+    например из админки. API вставляет связи через insert_recipe_bonds
+    без сигналов и меняет список сам.
+    """
+    if created:
+        add_recipe_to_shopping_list(instance.user, instance.recipe)
+
+
+@receiver(pre_delete, sender=Cart)
+def cart_deleted(instance, **kwargs):
+    """
+    Убирает рецепт из списка покупок при удалении Cart через ORM:
+    из админки и каскадом при удалении рецепта или пользователя.
+    API удаляет связи через delete_recipe_bonds без сигналов и меняет
+    список сам. pre_delete, а не post_delete: при каскаде ингредиенты
+    рецепта к этому моменту ещё не удалены.
+    """
+    remove_recipe_from_shopping_list(instance.user, instance.recipe)
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+DIGEST_RE = re.compile(r'[0-9a-f]{64}')
+
+
+def get_file_digest(content):
+    # Поле загрузки считает хэш при декодировании и кладёт в .digest.
+    if getattr(content, 'digest', None):
+        return content.digest
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def get_name_digest(name):
+    """Хэш содержимого из имени файла или None для старых имён."""
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    return stem if DIGEST_RE.fullmatch(stem) else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - sha256 его содержимого:
+    <каталог upload_to>/<2 символа хэша>/<хэш>.<расширение>.
+
+    Одинаковые файлы хранятся один раз под одним именем. Файл
+    записывается заново, даже если уже есть: запись атомарна
+    (временный файл и os.replace), поэтому читатели не видят
+    недописанный файл, а файл, удалённый параллельным
+    release_recipe_image, появляется снова. Свежая запись обновляет
+    время изменения, и release_recipe_image не удаляет такой файл,
+    пока загрузивший его запрос не успел закоммитить ссылку.
+    """
+
+    def get_content_name(self, name, content):
+        directory, file_name = posixpath.split(name)
+        extension = posixpath.splitext(file_name)[1].lower()
+        digest = get_file_digest(content)
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        name = self.get_content_name(name, content)
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def save_as(self, name, content):
+        """
+        Сохраняет производный файл под заданным именем, если его ещё
+        нет. Имя должно однозначно определяться содержимым, например
+        включать хэш исходного файла.
+        """
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+def get_recipe_image_storage():
+    return ContentAddressedStorage()
@@ -1,17 +1,21 @@
 import json
 import shutil
 import tempfile
+from io import StringIO
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import override_settings
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITransactionTestCase
 
-from api.models import Ingredient, Tag
+from api.models import Favorite, Ingredient, Recipe, Tag
+from api.tests.utils import send_concurrently
 from api.views.RecipeView import (recipe_already_deleted_msg,
                                   recipe_already_exists_msg)
+from users.models import Profile
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -140,3 +144,73 @@ class RecipeAPITests(APITransactionTestCase):
             json.loads(response.content),
             self.already_deleted
         )
+
+    def test_counters(self):
+        self.authorize_user(self.token)
+        self.client.post(self.favorite_url)
+        self.client.post('/api/recipes/1/shopping_cart/')
+        recipe = Recipe.objects.get(pk=1)
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.carts_count, 1)
+        self.assertEqual(
+            Profile.objects.get(user=self.user).recipes_count, 1
+        )
+        self.client.delete(self.favorite_url)
+        self.assertEqual(Recipe.objects.get(pk=1).favorites_count, 0)
+        self.client.delete(self.recipes_endpoint + '1/')
+        self.assertEqual(
+            Profile.objects.get(user=self.user).recipes_count, 0
+        )
+
+    def test_recount_counters(self):
+        self.authorize_user(self.token)
+        self.client.post(self.favorite_url)
+        Recipe.objects.update(favorites_count=5)
+        Profile.objects.all().delete()
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(Recipe.objects.get(pk=1).favorites_count, 1)
+        self.assertEqual(
+            Profile.objects.get(user=self.user).recipes_count, 1
+        )
+
+    def test_bulk_favorite(self):
+        self.authorize_user(self.token)
+        response = self.client.post(
+            '/api/recipes/favorite/',
+            content_type='application/json',
+            data=json.dumps({'ids': [1, 2]}),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {'results': [
+            {'id': 1, 'status': 'created'},
+            {'id': 2, 'status': 'not_found'},
+        ]})
+        self.assertTrue(Favorite.objects.filter(user=self.user).exists())
+        self.assertEqual(Recipe.objects.get(pk=1).favorites_count, 1)
+        response = self.client.delete(
+            '/api/recipes/favorite/',
+            content_type='application/json',
+            data=json.dumps({'ids': [1]}),
+        )
+        self.assertEqual(json.loads(response.content), {'results': [
+            {'id': 1, 'status': 'deleted'},
+        ]})
+        self.assertEqual(Recipe.objects.get(pk=1).favorites_count, 0)
+
+    def test_concurrent_favorite_requests(self):
+        self.assertEqual(
+            send_concurrently(
+                self.token, 'post', [self.favorite_url] * 5
+            ),
+            [status.HTTP_201_CREATED] + [status.HTTP_400_BAD_REQUEST] * 4
+        )
+        self.assertEqual(Favorite.objects.count(), 1)
+        self.assertEqual(Recipe.objects.get(pk=1).favorites_count, 1)
+        self.assertEqual(
+            send_concurrently(
+                self.token, 'delete', [self.favorite_url] * 5
+            ),
+            [status.HTTP_204_NO_CONTENT] + [status.HTTP_400_BAD_REQUEST] * 4
+        )
+        self.assertEqual(Favorite.objects.count(), 0)
+        self.assertEqual(Recipe.objects.get(pk=1).favorites_count, 0)
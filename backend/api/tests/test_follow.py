@@ -1,10 +1,15 @@
 import json
 
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.authtoken.models import Token
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 
+from api.models import Recipe
+from api.tests.utils import send_concurrently
+from users.models import Follow
 from users.views.user_view import (follow_not_exist_error, follow_twice_error,
                                    self_follow_error)
 
@@ -148,3 +153,115 @@ class UsersAPITests(APITestCase):
             json.loads(response.content),
             self.correct_follow_not_exist_error
         )
+
+    def create_author_with_recipes(self, number, recipes_count):
+        author = User.objects.create_user(
+            username=f'author_{number}',
+            password='some_strong_psw'
+        )
+        for recipe_number in range(recipes_count):
+            Recipe.objects.create(
+                author=author,
+                name=f'recipe_{recipe_number}',
+                image='recipes/test.png',
+                text='test_string',
+                cooking_time=1,
+            )
+        Follow.objects.create(user=self.user, author=author)
+        return author
+
+    def get_subscriptions(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                self.subscriptions_endpoint + '?limit=100&recipes_limit=2'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context), json.loads(response.content)['results']
+
+    def test_subscriptions_query_count(self):
+        self.authorize_user()
+        self.create_author_with_recipes(1, recipes_count=3)
+        few_follows_queries, _ = self.get_subscriptions()
+        for number in range(2, 6):
+            self.create_author_with_recipes(number, recipes_count=number)
+        many_follows_queries, results = self.get_subscriptions()
+        self.assertEqual(few_follows_queries, many_follows_queries)
+        self.assertEqual(len(results), 5)
+        for subscription in results:
+            with self.subTest(author=subscription['username']):
+                author = User.objects.get(username=subscription['username'])
+                self.assertTrue(subscription['is_subscribed'])
+                self.assertEqual(
+                    subscription['recipes_count'],
+                    author.recipes.count()
+                )
+                self.assertEqual(
+                    [recipe['id'] for recipe in subscription['recipes']],
+                    list(author.recipes.values_list('id', flat=True)[:2])
+                )
+
+    def test_subscriptions_cursor_pagination(self):
+        self.authorize_user()
+        for number in range(1, 4):
+            self.create_author_with_recipes(number, recipes_count=1)
+        response = self.client.get(
+            self.subscriptions_endpoint + '?cursor=&limit=2'
+        )
+        content = json.loads(response.content)
+        self.assertNotIn('count', content)
+        self.assertEqual(
+            [author['username'] for author in content['results']],
+            ['author_3', 'author_2'],
+        )
+        response = self.client.get(content['next'])
+        content = json.loads(response.content)
+        self.assertEqual(
+            [author['username'] for author in content['results']],
+            ['author_1'],
+        )
+        self.assertIsNone(content['next'])
+
+    def test_followers_count(self):
+        self.authorize_user()
+        self.client.post(self.follow_endpoint)
+        self.assertEqual(
+            User.objects.get(pk=2).profile.followers_count, 1
+        )
+        self.client.delete(self.follow_endpoint)
+        self.assertEqual(
+            User.objects.get(pk=2).profile.followers_count, 0
+        )
+
+
+class ConcurrentFollowTests(APITransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='vasya.pupkin', password='some_strong_psw'
+        )
+        self.author = User.objects.create_user(
+            username='author', password='some_strong_psw'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.follow_endpoint = f'/api/users/{self.author.pk}/subscribe/'
+
+    def test_concurrent_subscribe_requests(self):
+        self.assertEqual(
+            send_concurrently(
+                self.token, 'post', [self.follow_endpoint] * 5
+            ),
+            [status.HTTP_201_CREATED] + [status.HTTP_400_BAD_REQUEST] * 4
+        )
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).profile.followers_count, 1
+        )
+        self.assertEqual(
+            send_concurrently(
+                self.token, 'delete', [self.follow_endpoint] * 5
+            ),
+            [status.HTTP_204_NO_CONTENT] + [status.HTTP_400_BAD_REQUEST] * 4
+        )
+        self.assertEqual(Follow.objects.count(), 0)
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).profile.followers_count, 0
+        )
@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from rest_framework.test import APITestCase
+
+from api.models import Cart, Favorite, Recipe
+from users.models import Follow
+
+
+class QueryPlanTests(APITestCase):
+    """
+    Проверяет по EXPLAIN, что частые запросы API идут по индексам.
+    В PostgreSQL на пустых таблицах планировщик выбирает seq scan,
+    поэтому он отключается на время теста.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='vasya.pupkin',
+            password='some_strong_psw'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user,
+            name='test_string',
+            image='recipes/test.png',
+            text='test_string',
+            cooking_time=1,
+        )
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=plan)
+
+    def test_recipes_by_author(self):
+        self.assertUsesIndex(
+            Recipe.objects.filter(author=self.user).order_by('-id'),
+            'recipe_author_id_idx'
+        )
+
+    def test_user_lists(self):
+        for model, index_name in (
+            (Favorite, 'favorite_user_id_idx'),
+            (Cart, 'cart_user_id_idx'),
+            (Follow, 'follow_user_id_idx'),
+        ):
+            with self.subTest(model=model.__name__):
+                self.assertUsesIndex(
+                    model.objects.filter(user=self.user).order_by('-id'),
+                    index_name
+                )
+
+    def test_recipes_by_tag(self):
+        self.assertUsesIndex(
+            Recipe.tags.through.objects.filter(
+                tag_id=1
+            ).values_list('recipe_id'),
+            'recipe_tags_tag_recipe_idx'
+        )
@@ -1,9 +1,19 @@
 import json
-
+import tempfile
+from io import StringIO
+from unittest import skipIf
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
 from rest_framework import status
 from rest_framework.test import APITransactionTestCase
 
 from api.models import Ingredient
+from api.services.ingredient_index import ingredient_index
+from api.services.ingredient_loader import RowsFile
 
 
 class TagsAPITests(APITransactionTestCase):
@@ -38,6 +48,9 @@ class TagsAPITests(APITransactionTestCase):
         cls.search_url_not_exists = (cls.ingredients_endpoint
                                      + '?name=not_exists')
 
+    def setUp(self):
+        cache.clear()
+
     def create_ingredient(self):
         Ingredient.objects.create(
             name=self.test_ingredient['name'],
@@ -90,3 +103,100 @@ class TagsAPITests(APITransactionTestCase):
             json.loads(response.content),
             self.empty_ingredients_list
         )
+
+    def load_ingredients(self, content, suffix='.csv', **options):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix=suffix, encoding='utf-8', dir=settings.BASE_DIR
+        ) as catalog:
+            catalog.write(content)
+            catalog.flush()
+            call_command(
+                'load_ingredients', catalog.name,
+                batch_size=2, stdout=StringIO(), **options
+            )
+
+    def test_load_ingredients_csv(self):
+        self.create_ingredient()
+        self.load_ingredients(
+            'Капуста,кг\n"молоко 2,5%",г\nсоль,г\nсоль,г\nперец,г\n'
+        )
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', 'measurement_unit')),
+            {('Капуста', 'кг'), ('молоко 2,5%', 'г'), ('соль', 'г'),
+             ('перец', 'г')}
+        )
+        self.assertTrue(Ingredient.objects.filter(pk=1).exists())
+
+    def test_load_ingredients_json(self):
+        self.load_ingredients(
+            json.dumps([self.test_ingredient, self.test_ingredient]),
+            suffix='.json'
+        )
+        self.assertEqual(
+            list(Ingredient.objects.values('name', 'measurement_unit')),
+            [self.test_ingredient]
+        )
+
+    def test_load_ingredients_benchmark_rolls_back(self):
+        self.load_ingredients('соль,г\nперец,г\n', benchmark=True)
+        self.assertFalse(Ingredient.objects.exists())
+
+    @skipIf(connection.vendor == 'postgresql', 'COPY доступен')
+    def test_copy_requires_postgresql(self):
+        with self.assertRaises(CommandError):
+            self.load_ingredients('соль,г\n', method='copy')
+
+    def test_rows_file_streams_csv(self):
+        rows_file = RowsFile([('соль', 'г'), ('молоко 2,5%', 'г')])
+        self.assertEqual(rows_file.read(1), 'соль,г\r\n')
+        self.assertEqual(rows_file.read(), '"молоко 2,5%",г\r\n')
+        self.assertEqual(rows_file.read(), '')
+        self.assertEqual(rows_file.count, 2)
+
+    def search_names(self, term):
+        response = self.client.get(self.ingredients_endpoint + f'?name={term}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in json.loads(response.content)]
+
+    def test_search_prefix_matches_first(self):
+        for name in ('сок томатный', 'томаты', 'паста томатная', 'томат'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        self.assertEqual(
+            self.search_names('томат'),
+            ['томат', 'томаты', 'паста томатная', 'сок томатный']
+        )
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=2)
+    def test_search_result_limit(self):
+        for name in ('соль', 'соль морская', 'соль крупная'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        self.assertEqual(
+            self.search_names('соль'),
+            ['соль', 'соль крупная']
+        )
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=3)
+    def test_in_memory_search_matches_database(self):
+        for name in ('сок томатный', 'томаты', 'паста томатная', 'томат',
+                     'томатный соус', 'соль', 'соль морская', 'Tofu',
+                     'tofu'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        ingredient_index.ensure_loaded()
+        for term in ('т', 'том', 'томат', 'соль', 'ат', 'tof', 'нет такого'):
+            with self.subTest(term=term):
+                database_names = self.search_names(term)
+                with override_settings(INGREDIENT_SEARCH_IN_MEMORY=True):
+                    with self.assertNumQueries(0):
+                        self.search_names(term)
+                    self.assertEqual(self.search_names(term), database_names)
+
+    def test_in_memory_index_reloads_after_changes(self):
+        self.create_ingredient()
+        self.assertEqual(len(ingredient_index.search('Ка')), 1)
+        Ingredient.objects.create(name='Картофель', measurement_unit='г')
+        self.assertEqual(len(ingredient_index.search('Ка')), 2)
+        Ingredient.objects.filter(name='Капуста').get().delete()
+        self.assertEqual(
+            [ingredient.name for ingredient in ingredient_index.search('Ка')],
+            ['Картофель']
+        )
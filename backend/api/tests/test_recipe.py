@@ -1,15 +1,39 @@
+import base64
 import json
 import shutil
 import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.conf import settings
+from django.contrib import admin
 from django.contrib.auth.models import User
-from django.test import override_settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITransactionTestCase
 
-from api.models import Ingredient, Tag
+from api.admin import RecipeAdmin
+from api.models import (Cart, Favorite, Ingredient, IngredientAmountForRecipe,
+                        Recipe, RecipeScore, Tag)
+from api.serializers import RecipeSerializer
+from api.services import (get_tag_ids_by_slug, recount_counters,
+                          refresh_recipe_scores)
+from api.services.recipe_images import (IMAGE_FORMATS, get_image_file_names,
+                                        get_image_formats)
+from api.storage import get_name_digest
+from users.models import Follow
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -294,7 +318,7 @@ class RecipeAPITests(APITransactionTestCase):
             self.validation_repeat_error
         )
 
-    def test_404_for_null_recipe(self):
+    def test_400_for_not_existing_ingredient(self):
         self.authorize_user(self.token)
         self.ingredient.delete()
         response = self.client.post(
@@ -302,7 +326,66 @@ class RecipeAPITests(APITransactionTestCase):
             content_type='application/json',
             data=self.json_data
         )
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            json.loads(response.content),
+            {'ingredients': ['Ингредиент 1 не найден']}
+        )
+
+    def test_validation_reports_all_errors_at_once(self):
+        self.authorize_user(self.token)
+        Ingredient.objects.create(name='salt', measurement_unit='g')
+        data = dict(
+            self.test_recipe_data,
+            ingredients=[
+                {'id': 1, 'amount': 10},
+                {'id': 1, 'amount': 5},
+                {'id': 2, 'amount': 0},
+                {'id': 98, 'amount': 1},
+                {'id': 'abc', 'amount': 1},
+            ],
+            tags=[1, 1, 99],
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                self.recipes_endpoint,
+                content_type='application/json',
+                data=json.dumps(data)
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(json.loads(response.content), {
+            'test_ingredient': ['test_ingredient указано несколько раз'],
+            'salt': ['Количество salt должно быть больше 0'],
+            'ingredients': [
+                'Ингредиент 98 не найден', 'Ингредиент abc не найден'
+            ],
+            'tags': ['Тег 1 указан несколько раз', 'Тег 99 не найден'],
+        })
+        ingredient_queries = [
+            query for query in context.captured_queries
+            if 'api_ingredient' in query['sql']
+        ]
+        self.assertEqual(len(ingredient_queries), 1)
+        tag_queries = [
+            query for query in context.captured_queries
+            if 'FROM "api_tag"' in query['sql']
+        ]
+        self.assertEqual(len(tag_queries), 1)
+
+    def test_tags_validated_against_database(self):
+        get_tag_ids_by_slug()
+        # bulk_create не шлёт сигналов: кэш тегов остаётся старым.
+        Tag.objects.bulk_create([
+            Tag(name='new_tag', color='#000000', slug='new_tag')
+        ])
+        new_tag = Tag.objects.get(slug='new_tag')
+        self.authorize_user(self.token)
+        response = self.client.post(
+            self.recipes_endpoint,
+            content_type='application/json',
+            data=json.dumps(dict(self.test_recipe_data, tags=[new_tag.pk]))
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
     def test_anonymous_cant_delete_recipe(self):
         self.authorize_user(self.token)
@@ -380,6 +463,97 @@ class RecipeAPITests(APITransactionTestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_patch_keeps_concurrent_counter_updates(self):
+        self.authorize_user(self.token)
+        self.client.post(
+            self.recipes_endpoint,
+            content_type='application/json',
+            data=self.json_data
+        )
+        variants = {'jpeg': {'150': 'recipes/variants/new_150.jpg'}}
+        update_ingredients = RecipeSerializer.update_ingredients
+
+        def update_during_edit(serializer, ingredients, recipe):
+            # Параллельный запрос в избранное и фоновая задача вариантов.
+            Recipe.objects.filter(pk=recipe.pk).update(
+                favorites_count=F('favorites_count') + 1,
+                image_variants=variants,
+            )
+            return update_ingredients(serializer, ingredients, recipe)
+
+        data = json.loads(self.json_changed_data)
+        del data['image']
+        with mock.patch.object(
+            RecipeSerializer, 'update_ingredients', update_during_edit
+        ):
+            response = self.client.patch(
+                self.recipes_detail_endpoint,
+                content_type='application/json',
+                data=json.dumps(data)
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        recipe = Recipe.objects.get(pk=1)
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.image_variants, variants)
+        self.assertEqual(recipe.name, data['name'])
+
+    def save_recipe_in_admin(self, recipe, changes, files=None):
+        request = RequestFactory().post('/admin/')
+        request.user = User.objects.create_superuser(
+            username='admin', password='some_strong_psw'
+        )
+        model_admin = RecipeAdmin(Recipe, admin.site)
+        form_class = model_admin.get_form(request, recipe, change=True)
+        self.assertNotIn('favorites_count', form_class.base_fields)
+        form = form_class(instance=recipe)
+        data = {name: form[name].value() for name in form.fields}
+        data.update(changes)
+        form = form_class(
+            data={
+                name: value for name, value in data.items()
+                if value is not None
+            },
+            files=files,
+            instance=recipe,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        model_admin.save_model(request, form.save(commit=False), form, True)
+
+    def test_admin_save_keeps_concurrent_counter_updates(self):
+        self.authorize_user(self.token)
+        self.client.post(
+            self.recipes_endpoint,
+            content_type='application/json',
+            data=self.json_data
+        )
+        recipe = Recipe.objects.get(pk=1)
+        variants = {'jpeg': {'150': 'recipes/variants/new_150.jpg'}}
+        # Параллельный запрос в избранное и фоновая задача вариантов.
+        Recipe.objects.filter(pk=1).update(
+            favorites_count=F('favorites_count') + 1,
+            image_variants=variants,
+        )
+        self.save_recipe_in_admin(recipe, {'name': 'admin_name'})
+        recipe = Recipe.objects.get(pk=1)
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.image_variants, variants)
+        self.assertEqual(recipe.name, 'admin_name')
+        self.assertEqual(recipe.slug, 'admin-name')
+
+    def test_recipes_count_follows_orm_changes(self):
+        recipe = Recipe.objects.create(
+            author=self.user,
+            name='orm_recipe',
+            image='recipes/test.png',
+            text='test_string',
+            cooking_time=1,
+        )
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.recipes_count, 1)
+        recipe.delete()
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.recipes_count, 0)
+
     def test_not_author_cant_patch(self):
         self.authorize_user(self.token)
         self.client.post(
@@ -409,3 +583,580 @@ class RecipeAPITests(APITransactionTestCase):
             data={}
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def create_recipes(self, count):
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=self.yet_another_user,
+                name=f'recipe_{number}',
+                image='recipes/test.png',
+                text='test_string',
+                cooking_time=1,
+            )
+            recipe.tags.set([self.tag])
+            IngredientAmountForRecipe.objects.create(
+                recipe=recipe,
+                ingredient=self.ingredient,
+                amount=10,
+            )
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            Cart.objects.create(user=self.user, recipe=recipe)
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.recipes_endpoint + '?limit=100')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context), json.loads(response.content)
+
+    def test_recipes_list_query_count_not_depends_on_page_size(self):
+        Follow.objects.create(user=self.user, author=self.yet_another_user)
+        self.authorize_user(self.token)
+        self.create_recipes(2)
+        small_page_queries, _ = self.count_list_queries()
+        self.create_recipes(8)
+        big_page_queries, content = self.count_list_queries()
+        self.assertEqual(small_page_queries, big_page_queries)
+        self.assertEqual(len(content['results']), 10)
+        recipe = content['results'][0]
+        self.assertTrue(recipe['is_favorited'])
+        self.assertTrue(recipe['is_in_shopping_cart'])
+        self.assertTrue(recipe['author']['is_subscribed'])
+        self.assertEqual(recipe['ingredients'][0]['amount'], 10)
+
+    def create_recipe(self, name):
+        return Recipe.objects.create(
+            author=self.yet_another_user,
+            name=name,
+            image='recipes/test.png',
+            text='test_string',
+            cooking_time=1,
+        )
+
+    def get_ordered_names(self, ordering):
+        response = self.client.get(
+            self.recipes_endpoint + f'?ordering={ordering}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            recipe['name'] for recipe in json.loads(response.content)[
+                'results'
+            ]
+        ]
+
+    def test_popular_and_trending_ordering(self):
+        old_hit = self.create_recipe('old_hit')
+        fresh = self.create_recipe('fresh')
+        self.create_recipe('forgotten')
+        for user in (self.user, self.yet_another_user):
+            Favorite.objects.create(user=user, recipe=old_hit)
+        Favorite.objects.filter(recipe=old_hit).update(
+            created=timezone.now() - timedelta(days=30)
+        )
+        Favorite.objects.create(user=self.user, recipe=fresh)
+        recount_counters()
+        refresh_recipe_scores()
+        self.create_recipe('created_after_refresh')
+
+        self.assertEqual(
+            self.get_ordered_names('popular'),
+            ['old_hit', 'fresh', 'created_after_refresh', 'forgotten'],
+        )
+        self.assertEqual(
+            self.get_ordered_names('trending'),
+            ['fresh', 'created_after_refresh', 'forgotten', 'old_hit'],
+        )
+
+    def test_refresh_recipe_scores_updates_rows_in_place(self):
+        hit = self.create_recipe('hit')
+        unscored = self.create_recipe('unscored')
+        Favorite.objects.create(user=self.user, recipe=hit)
+        recount_counters()
+        RecipeScore.objects.filter(recipe=unscored).delete()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(refresh_recipe_scores(), 2)
+        # Строки не пересоздаются: вставка конфликтовала бы со строкой,
+        # которую параллельно создаёт сигнал нового рецепта.
+        for query in context.captured_queries:
+            self.assertNotIn('DELETE', query['sql'].upper())
+        self.assertEqual(
+            dict(RecipeScore.objects.values_list('recipe_id', 'popular')),
+            {hit.pk: 1.0, unscored.pk: 0.0},
+        )
+
+    def test_ordering_reads_scores_by_inner_join(self):
+        self.create_recipe('recipe')
+        with CaptureQueriesContext(connection) as context:
+            self.get_ordered_names('popular')
+        sql = next(
+            query['sql'] for query in context.captured_queries
+            if 'api_recipescore' in query['sql']
+            and 'ORDER BY' in query['sql']
+        )
+        self.assertIn('INNER JOIN "api_recipescore"', sql)
+        self.assertNotIn('NULLS', sql)
+
+    def test_unknown_ordering_is_rejected(self):
+        response = self.client.get(self.recipes_endpoint + '?ordering=name')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cursor_pagination(self):
+        self.create_recipes(5)
+        url = self.recipes_endpoint + '?cursor=&limit=2'
+        names = []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            for query in context.captured_queries:
+                self.assertNotIn('COUNT(', query['sql'].upper())
+                self.assertNotIn('OFFSET', query['sql'].upper())
+            content = json.loads(response.content)
+            self.assertNotIn('count', content)
+            names += [recipe['name'] for recipe in content['results']]
+            url = content['next']
+        self.assertEqual(
+            names, [f'recipe_{number}' for number in range(4, -1, -1)]
+        )
+
+    def test_page_number_pagination_is_default(self):
+        self.create_recipes(3)
+        response = self.client.get(self.recipes_endpoint + '?limit=2')
+        content = json.loads(response.content)
+        self.assertEqual(content['count'], 3)
+        self.assertEqual(len(content['results']), 2)
+        self.assertIn('page=2', content['next'])
+
+    def get_count(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        count_queries = [
+            query for query in context.captured_queries
+            if 'COUNT(' in query['sql'].upper()
+        ]
+        return json.loads(response.content)['count'], len(count_queries)
+
+    @override_settings(PAGINATION_COUNT_MODE='cached')
+    def test_cached_count(self):
+        cache.clear()
+        self.create_recipes(3)
+        self.assertEqual(self.get_count(self.recipes_endpoint), (3, 1))
+        self.create_recipes(1)
+        self.assertEqual(self.get_count(self.recipes_endpoint), (3, 0))
+        self.assertEqual(
+            self.get_count(self.recipes_endpoint + '?author=2'), (4, 1)
+        )
+        self.authorize_user(self.token)
+        self.assertEqual(self.get_count(self.recipes_endpoint), (3, 0))
+
+    @override_settings(PAGINATION_COUNT_MODE='exact')
+    def test_exact_count(self):
+        self.create_recipes(3)
+        self.assertEqual(self.get_count(self.recipes_endpoint), (3, 1))
+        self.create_recipes(1)
+        self.assertEqual(self.get_count(self.recipes_endpoint), (4, 1))
+
+    def get_names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = json.loads(response.content)
+        return content['count'], sorted(
+            recipe['name'] for recipe in content['results']
+        )
+
+    def test_filter_by_tags(self):
+        self.check_filter_by_tags()
+
+    @override_settings(RECIPE_TAGS_BITMASK_FILTER=True)
+    def test_filter_by_tags_mask(self):
+        self.check_filter_by_tags()
+
+    def check_filter_by_tags(self):
+        cache.clear()
+        other_tag = Tag.objects.create(
+            name='other_tag_name', color='#000000', slug='other_tag_slug'
+        )
+        both = self.create_recipe('both')
+        both.tags.set([self.tag, other_tag])
+        self.create_recipe('first').tags.set([self.tag])
+        self.create_recipe('second').tags.set([other_tag])
+        self.create_recipe('untagged')
+        url = (self.recipes_endpoint
+               + '?tags=test_tag_slug&tags=other_tag_slug')
+
+        self.assertEqual(
+            self.get_names(url), (3, ['both', 'first', 'second'])
+        )
+        self.assertEqual(
+            self.get_names(url + '&tags_mode=all'), (1, ['both'])
+        )
+        self.assertEqual(
+            self.get_names(self.recipes_endpoint + '?tags=other_tag_slug'),
+            (2, ['both', 'second']),
+        )
+
+    def test_filter_by_unknown_tag_is_rejected(self):
+        response = self.client.get(self.recipes_endpoint + '?tags=unknown')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_filter_by_tags_without_shared_cache(self):
+        self.create_recipe('first').tags.set([self.tag])
+        self.get_names(self.recipes_endpoint + '?tags=test_tag_slug')
+        # bulk_create не шлёт сигналов, как и изменения в другом процессе.
+        Tag.objects.bulk_create([
+            Tag(name='new_tag', color='#000000', slug='new_tag', bit=1)
+        ])
+        self.create_recipe('second').tags.set(
+            Tag.objects.filter(slug='new_tag')
+        )
+        self.assertEqual(
+            self.get_names(self.recipes_endpoint + '?tags=new_tag'),
+            (1, ['second']),
+        )
+        Tag.objects.filter(slug='new_tag').delete()
+        response = self.client.get(self.recipes_endpoint + '?tags=new_tag')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_filter_by_tags_does_not_query_tags(self):
+        cache.clear()
+        self.create_recipes(2)
+        self.client.get(self.recipes_endpoint + '?tags=test_tag_slug')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                self.recipes_endpoint + '?tags=test_tag_slug'
+            )
+        self.assertEqual(json.loads(response.content)['count'], 2)
+        with CaptureQueriesContext(connection) as unfiltered_context:
+            self.client.get(self.recipes_endpoint)
+        self.assertEqual(len(context), len(unfiltered_context))
+        for query in context.captured_queries:
+            self.assertNotIn('DISTINCT', query['sql'].upper())
+
+    def get_mask(self, recipe):
+        return Recipe.objects.get(pk=recipe.pk).tags_mask
+
+    def test_tags_mask_follows_recipe_tags(self):
+        other_tag = Tag.objects.create(
+            name='other_tag_name', color='#000000', slug='other_tag_slug'
+        )
+        self.assertEqual((self.tag.bit, other_tag.bit), (0, 1))
+        recipe = self.create_recipe('recipe')
+        recipe.tags.set([self.tag, other_tag])
+        self.assertEqual(self.get_mask(recipe), 0b11)
+        recipe.tags.remove(self.tag)
+        self.assertEqual(self.get_mask(recipe), 0b10)
+        self.tag.recipe_set.add(recipe)
+        self.assertEqual(self.get_mask(recipe), 0b11)
+        self.tag.recipe_set.clear()
+        self.assertEqual(self.get_mask(recipe), 0b10)
+        other_tag.delete()
+        self.assertEqual(self.get_mask(recipe), 0)
+        third_tag = Tag.objects.create(
+            name='third_tag_name', color='#111111', slug='third_tag_slug'
+        )
+        self.assertEqual(third_tag.bit, 1)
+
+    def test_update_writes_only_changed_ingredient(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient_{number}', measurement_unit='g')
+            for number in range(4)
+        )
+        ingredients = [
+            {'id': pk, 'amount': 10}
+            for pk in Ingredient.objects.values_list('pk', flat=True)
+        ]
+        data = dict(self.test_recipe_data, ingredients=ingredients)
+        self.authorize_user(self.token)
+        self.client.post(
+            self.recipes_endpoint,
+            content_type='application/json',
+            data=json.dumps(data)
+        )
+        ingredients[0] = dict(ingredients[0], amount=20)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                self.recipes_detail_endpoint,
+                content_type='application/json',
+                data=json.dumps(data)
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')
+        ]
+        self.assertEqual(len(writes), 2, writes)
+        self.assertEqual(
+            sorted(
+                (item['id'], item['amount'])
+                for item in json.loads(response.content)['ingredients']
+            ),
+            sorted((item['id'], item['amount']) for item in ingredients)
+        )
+
+    def test_update_replaces_removed_ingredients(self):
+        another_ingredient = Ingredient.objects.create(
+            name='another_ingredient', measurement_unit='g'
+        )
+        self.authorize_user(self.token)
+        self.client.post(
+            self.recipes_endpoint,
+            content_type='application/json',
+            data=self.json_data
+        )
+        data = dict(
+            self.test_recipe_data,
+            ingredients=[{'id': another_ingredient.id, 'amount': 3}],
+        )
+        response = self.client.patch(
+            self.recipes_detail_endpoint,
+            content_type='application/json',
+            data=json.dumps(data)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(IngredientAmountForRecipe.objects.values_list(
+                'ingredient__name', 'amount'
+            )),
+            [('another_ingredient', 3)]
+        )
+
+    def make_image_data(self, size=(1000, 500)):
+        buffer = BytesIO()
+        Image.new('RGB', size, '#FF8800').save(buffer, 'PNG')
+        return ('data:image/png;base64,'
+                + base64.b64encode(buffer.getvalue()).decode())
+
+    def create_recipe_with_image(self, image):
+        self.authorize_user(self.token)
+        return self.client.post(
+            self.recipes_endpoint,
+            content_type='application/json',
+            data=json.dumps(dict(self.test_recipe_data, image=image))
+        )
+
+    def test_image_variants(self):
+        response = self.create_recipe_with_image(self.make_image_data())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        variants = Recipe.objects.get(pk=1).image_variants
+        self.assertEqual(list(variants), list(get_image_formats()))
+        for image_format, widths in variants.items():
+            self.assertEqual(list(widths), ['150', '480', '1000'])
+            for width, name in widths.items():
+                with default_storage.open(name) as image_file:
+                    image = Image.open(image_file)
+                    self.assertEqual(image.width, int(width))
+                    self.assertEqual(
+                        image.format, IMAGE_FORMATS[image_format][0]
+                    )
+
+        detail = json.loads(
+            self.client.get(self.recipes_detail_endpoint).content
+        )
+        self.assertNotIn('recipes/variants/', detail['image'])
+        self.assertEqual(list(detail['images']), list(variants))
+        self.assertTrue(
+            detail['images']['webp']['480'].endswith(variants['webp']['480'])
+        )
+        listed = json.loads(self.client.get(self.recipes_endpoint).content)
+        self.assertTrue(
+            listed['results'][0]['image'].endswith(variants['jpeg']['480'])
+        )
+        favorite = json.loads(self.client.post(
+            self.recipes_detail_endpoint + 'favorite/'
+        ).content)
+        self.assertTrue(
+            favorite['image'].endswith(variants['jpeg']['150'])
+        )
+        self.assertTrue(
+            detail['images']['jpeg']['150'].endswith(
+                favorite['images']['jpeg']['150']
+            )
+        )
+
+    def test_small_image_is_not_upscaled(self):
+        self.create_recipe_with_image(self.make_image_data(size=(100, 50)))
+        recipe = Recipe.objects.get(pk=1)
+        self.assertEqual(list(recipe.image_variants['jpeg']), ['100'])
+        detail = json.loads(
+            self.client.get(self.recipes_detail_endpoint).content
+        )
+        listed = json.loads(self.client.get(self.recipes_endpoint).content)
+        self.assertEqual(
+            listed['results'][0]['image'], detail['images']['jpeg']['100']
+        )
+
+    def test_refresh_image_variants(self):
+        self.create_recipe_with_image(self.make_image_data())
+        Recipe.objects.update(image_variants={})
+        call_command('refresh_image_variants', stdout=StringIO())
+        self.assertEqual(
+            list(Recipe.objects.get(pk=1).image_variants),
+            list(get_image_formats())
+        )
+
+    def test_refresh_replaces_legacy_variants(self):
+        self.create_recipe_with_image(self.make_image_data())
+        Recipe.objects.update(image_variants={'card': 'recipes/old.jpg'})
+        detail = json.loads(
+            self.client.get(self.recipes_detail_endpoint).content
+        )
+        self.assertEqual(detail['images'], {})
+        call_command('refresh_image_variants', '--all', stdout=StringIO())
+        self.assertIn('jpeg', Recipe.objects.get(pk=1).image_variants)
+
+    @override_settings(RECIPE_IMAGE_VARIANTS_SYNC=False)
+    def test_image_variants_in_background(self):
+        response = self.create_recipe_with_image(self.make_image_data())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        deadline = time.monotonic() + 10
+        while not Recipe.objects.get(pk=1).image_variants:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=1024)
+    def test_image_size_limit(self):
+        response = self.create_recipe_with_image(
+            'data:image/png;base64,' + 'A' * 2000
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', json.loads(response.content))
+
+    def test_invalid_image_rejected(self):
+        response = self.create_recipe_with_image(
+            'data:image/png;base64,'
+            + base64.b64encode(b'not an image').decode()
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', json.loads(response.content))
+
+    @override_settings(RECIPE_IMAGE_RELEASE_MIN_AGE=0)
+    def test_identical_images_share_one_file(self):
+        image = self.make_image_data()
+        self.create_recipe_with_image(image)
+        self.create_recipe_with_image(image)
+        first, second = Recipe.objects.order_by('pk')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_variants, second.image_variants)
+        names = {
+            first.image.name, *get_image_file_names(first.image_variants)
+        }
+
+        self.client.delete(self.recipes_detail_endpoint)
+        self.assertTrue(all(default_storage.exists(name) for name in names))
+        self.client.delete(f'{self.recipes_endpoint}{second.pk}/')
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+    @override_settings(RECIPE_IMAGE_RELEASE_MIN_AGE=60)
+    def test_fresh_image_is_not_released(self):
+        image = self.make_image_data()
+        self.create_recipe_with_image(image)
+        name = Recipe.objects.get(pk=1).image.name
+        # Файл удалён параллельным release_recipe_image, пока запрос
+        # с той же картинкой ещё не закоммитил ссылку: запись его
+        # восстанавливает.
+        default_storage.delete(name)
+        self.create_recipe_with_image(image)
+        self.assertTrue(default_storage.exists(name))
+        # Свежий файл без ссылок остаётся для collect_media_garbage.
+        Recipe.objects.all().delete()
+        self.assertTrue(default_storage.exists(name))
+
+    @override_settings(RECIPE_IMAGE_RELEASE_MIN_AGE=0)
+    def test_replaced_image_is_released(self):
+        self.create_recipe_with_image(self.make_image_data())
+        old_name = Recipe.objects.get(pk=1).image.name
+        response = self.client.patch(
+            self.recipes_detail_endpoint,
+            content_type='application/json',
+            data=json.dumps(dict(
+                self.test_recipe_data,
+                image=self.make_image_data(size=(800, 400))
+            ))
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        recipe = Recipe.objects.get(pk=1)
+        self.assertNotEqual(recipe.image.name, old_name)
+        self.assertEqual(
+            list(recipe.image_variants['jpeg']), ['150', '480', '800']
+        )
+        self.assertFalse(default_storage.exists(old_name))
+
+    @override_settings(RECIPE_IMAGE_RELEASE_MIN_AGE=0)
+    def test_image_replaced_in_admin_is_released(self):
+        self.create_recipe_with_image(self.make_image_data())
+        recipe = Recipe.objects.get(pk=1)
+        old_name = recipe.image.name
+        old_variants = get_image_file_names(recipe.image_variants)
+        buffer = BytesIO()
+        Image.new('RGB', (800, 400), '#0088FF').save(buffer, 'PNG')
+        self.save_recipe_in_admin(recipe, {}, files={
+            'image': SimpleUploadedFile('new.png', buffer.getvalue()),
+        })
+        recipe = Recipe.objects.get(pk=1)
+        self.assertNotEqual(recipe.image.name, old_name)
+        self.assertEqual(
+            list(recipe.image_variants['jpeg']), ['150', '480', '800']
+        )
+        for name in [old_name, *old_variants]:
+            with self.subTest(name=name):
+                self.assertFalse(default_storage.exists(name))
+
+    def test_collect_media_garbage(self):
+        self.create_recipe_with_image(self.make_image_data())
+        recipe = Recipe.objects.get(pk=1)
+        orphan = default_storage.save(
+            'recipes/ff/orphan.png', BytesIO(b'orphan')
+        )
+        call_command('collect_media_garbage', '--min-age=0',
+                     '--dry-run', stdout=StringIO())
+        self.assertTrue(default_storage.exists(orphan))
+        call_command('collect_media_garbage', '--min-age=0',
+                     stdout=StringIO())
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(recipe.image.name))
+        for name in get_image_file_names(recipe.image_variants):
+            self.assertTrue(default_storage.exists(name))
+
+    def test_unchanged_image_is_not_rewritten(self):
+        self.create_recipe_with_image(self.make_image_data())
+        recipe = Recipe.objects.get(pk=1)
+        detail = json.loads(
+            self.client.get(self.recipes_detail_endpoint).content
+        )
+        references = (
+            detail['image'],
+            recipe.image.name,
+            get_name_digest(recipe.image.name),
+            self.make_image_data(),
+        )
+        for image in references:
+            with self.subTest(image=image[:40]), mock.patch(
+                'api.storage.ContentAddressedStorage._save'
+            ) as save, mock.patch(
+                'api.services.recipe_images.build_image_variants'
+            ) as build:
+                response = self.client.patch(
+                    self.recipes_detail_endpoint,
+                    content_type='application/json',
+                    data=json.dumps(dict(self.test_recipe_data, image=image))
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                save.assert_not_called()
+                build.assert_not_called()
+                self.assertEqual(
+                    Recipe.objects.get(pk=1).image_variants,
+                    recipe.image_variants
+                )
+
+    def test_foreign_image_reference_is_rejected(self):
+        self.create_recipe_with_image(self.make_image_data())
+        response = self.client.patch(
+            self.recipes_detail_endpoint,
+            content_type='application/json',
+            data=json.dumps(dict(
+                self.test_recipe_data, image='recipes/ab/other.png'
+            ))
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', json.loads(response.content))
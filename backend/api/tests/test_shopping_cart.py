@@ -1,15 +1,24 @@
 import json
 import shutil
 import tempfile
+from io import StringIO
 
 from django.conf import settings
+from django.contrib import admin
 from django.contrib.auth.models import User
-from django.test import override_settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITransactionTestCase
 
-from api.models import Ingredient, Tag
+from api.admin import IngredientAmountForRecipeAdmin
+from api.models import (Cart, Ingredient, IngredientAmountForRecipe, Recipe,
+                        ShoppingListItem, Tag)
+from api.services import get_shopping_list
+from api.tests.utils import send_concurrently
 from api.views.RecipeView import (recipe_already_deleted_msg,
                                   recipe_already_exists_msg)
 
@@ -33,6 +42,8 @@ class RecipeAPITests(APITransactionTestCase):
         cls.not_existing_url = "/api/recipes/2/shopping_cart/"
         cls.recipes_endpoint = '/api/recipes/'
         cls.download_cart_url = '/api/recipes/download_shopping_cart/'
+        cls.summary_url = '/api/recipes/shopping_cart_summary/'
+        cls.bulk_shopping_url = '/api/recipes/shopping_cart/'
 
         cls.test_recipe_data = {
             "ingredients": [{"id": 1, "amount": 10}],
@@ -56,6 +67,13 @@ class RecipeAPITests(APITransactionTestCase):
         ]
 
         cls.download_text = b'test_ingredient: 10 test\n'
+        cls.download_formats = {
+            'txt': 'test_ingredient: 10 test\n',
+            'csv': 'name,amount,measurement_unit\r\n'
+                   'test_ingredient,10,test\r\n',
+            'json': '[{"name": "test_ingredient", "amount": 10, '
+                    '"measurement_unit": "test"}]',
+        }
 
         cls.already_in_cart = {
             'errors': recipe_already_exists_msg
@@ -155,4 +173,305 @@ class RecipeAPITests(APITransactionTestCase):
         self.client.post(self.shopping_url)
         response = self.client.get(self.download_cart_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.content, self.download_text)
+        self.assertEqual(
+            b''.join(response.streaming_content),
+            self.download_text
+        )
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="shopping_list.txt"'
+        )
+
+    def test_download_formats(self):
+        self.authorize_user(self.token)
+        self.client.post(self.shopping_url)
+        for export_format, content in self.download_formats.items():
+            with self.subTest(export_format=export_format):
+                response = self.client.get(
+                    self.download_cart_url + f'?format={export_format}'
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(
+                    b''.join(response.streaming_content).decode(),
+                    content
+                )
+                self.assertEqual(
+                    response['Content-Disposition'],
+                    f'attachment; filename="shopping_list.{export_format}"'
+                )
+
+    def test_download_format_by_accept_header(self):
+        self.authorize_user(self.token)
+        self.client.post(self.shopping_url)
+        response = self.client.get(
+            self.download_cart_url,
+            HTTP_ACCEPT='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content)),
+            [{'name': 'test_ingredient', 'amount': 10,
+              'measurement_unit': 'test'}]
+        )
+
+    def create_recipe_in_cart(self, amounts):
+        recipe = self.create_recipe(amounts)
+        Cart.objects.create(user=self.user, recipe=recipe)
+        return recipe
+
+    def create_recipe(self, amounts):
+        recipe = Recipe.objects.create(
+            author=self.user,
+            name='another_test_string',
+            image='recipes/test.png',
+            text='test_string',
+            cooking_time=1,
+        )
+        IngredientAmountForRecipe.objects.bulk_create(
+            IngredientAmountForRecipe(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            ) for ingredient, amount in amounts
+        )
+        return recipe
+
+    def test_summary_not_allowed_for_anonymous(self):
+        response = self.client.get(self.summary_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_summary_sums_each_ingredient_once(self):
+        another_ingredient = Ingredient.objects.create(
+            name='another_ingredient',
+            measurement_unit='test'
+        )
+        self.authorize_user(self.token)
+        self.client.post(self.shopping_url)
+        self.create_recipe_in_cart(
+            [(self.ingredient, 5), (another_ingredient, 7)]
+        )
+        response = self.client.get(self.summary_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(response.content),
+            [
+                {'id': another_ingredient.id, 'name': 'another_ingredient',
+                 'measurement_unit': 'test', 'amount': 7},
+                {'id': self.ingredient.id, 'name': 'test_ingredient',
+                 'measurement_unit': 'test', 'amount': 15},
+            ]
+        )
+
+    def test_summary_for_big_cart_is_one_query(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient_{number}', measurement_unit='g')
+            for number in range(10)
+        )
+        ingredients = list(Ingredient.objects.filter(
+            name__startswith='ingredient_'
+        ))
+        for _ in range(500):
+            self.create_recipe_in_cart(
+                [(ingredient, 2) for ingredient in ingredients]
+            )
+        with self.assertNumQueries(1):
+            totals = list(get_shopping_list(self.user))
+        self.assertEqual(len(totals), len(ingredients))
+        for item in totals:
+            with self.subTest(name=item['name']):
+                self.assertEqual(item['amount'], 1000)
+
+    def get_shopping_list(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.user
+        ).values_list('ingredient__name', 'total_amount'))
+
+    def test_shopping_list_follows_cart(self):
+        self.authorize_user(self.token)
+        self.client.post(self.shopping_url)
+        self.assertEqual(self.get_shopping_list(), {'test_ingredient': 10})
+        self.client.delete(self.shopping_url)
+        self.assertEqual(self.get_shopping_list(), {})
+
+    def test_shopping_list_follows_recipe_update(self):
+        another_ingredient = Ingredient.objects.create(
+            name='another_ingredient',
+            measurement_unit='test'
+        )
+        self.authorize_user(self.token)
+        self.client.post(self.shopping_url)
+        self.create_recipe_in_cart([(self.ingredient, 5)])
+        changed_data = dict(
+            self.test_recipe_data,
+            ingredients=[{'id': another_ingredient.id, 'amount': 3}]
+        )
+        self.client.patch(
+            self.recipes_endpoint + '1/',
+            content_type='application/json',
+            data=json.dumps(changed_data)
+        )
+        self.assertEqual(
+            self.get_shopping_list(),
+            {'test_ingredient': 5, 'another_ingredient': 3}
+        )
+        self.client.delete(self.recipes_endpoint + '1/')
+        self.assertEqual(self.get_shopping_list(), {'test_ingredient': 5})
+        call_command('rebuild_shopping_lists', verify=True, stdout=StringIO())
+
+    def test_rebuild_shopping_lists(self):
+        self.authorize_user(self.token)
+        self.client.post(self.shopping_url)
+        ShoppingListItem.objects.update(total_amount=1)
+        with self.assertRaises(CommandError):
+            call_command(
+                'rebuild_shopping_lists', verify=True, stdout=StringIO()
+            )
+        call_command('rebuild_shopping_lists', stdout=StringIO())
+        self.assertEqual(self.get_shopping_list(), {'test_ingredient': 10})
+
+    def bulk_request(self, method, ids):
+        response = getattr(self.client, method)(
+            self.bulk_shopping_url,
+            content_type='application/json',
+            data=json.dumps({'ids': ids}),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {
+            result['id']: result['status']
+            for result in json.loads(response.content)['results']
+        }
+
+    def test_bulk_shopping_cart(self):
+        self.authorize_user(self.token)
+        self.client.post(self.shopping_url)
+        second = self.create_recipe([(self.ingredient, 5)])
+        third = self.create_recipe([(self.ingredient, 7)])
+
+        self.assertEqual(
+            self.bulk_request('post', [1, second.id, third.id, second.id, 99]),
+            {1: 'already_exists', second.id: 'created',
+             third.id: 'created', 99: 'not_found'},
+        )
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(self.get_shopping_list(), {'test_ingredient': 22})
+        self.assertEqual(
+            list(Recipe.objects.order_by('id').values_list(
+                'carts_count', flat=True
+            )),
+            [1, 1, 1],
+        )
+
+        self.assertEqual(
+            self.bulk_request('delete', [1, third.id, 99]),
+            {1: 'deleted', third.id: 'deleted', 99: 'not_found'},
+        )
+        self.assertEqual(
+            self.bulk_request('delete', [third.id]),
+            {third.id: 'already_deleted'},
+        )
+        self.assertEqual(self.get_shopping_list(), {'test_ingredient': 5})
+        self.assertEqual(
+            Recipe.objects.get(pk=third.id).carts_count, 0
+        )
+        call_command('rebuild_shopping_lists', verify=True, stdout=StringIO())
+
+    def test_bulk_shopping_cart_query_count_not_depends_on_ids(self):
+        recipes = [
+            self.create_recipe([(self.ingredient, 1)]) for _ in range(10)
+        ]
+        self.authorize_user(self.token)
+        query_counts = []
+        for chunk in (recipes[:2], recipes[2:]):
+            with CaptureQueriesContext(connection) as context:
+                self.bulk_request('post', [recipe.id for recipe in chunk])
+            query_counts.append(len(context))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_bulk_shopping_cart_validation(self):
+        self.authorize_user(self.token)
+        for data in ({}, {'ids': []}, {'ids': ['abc']}):
+            with self.subTest(data=data):
+                response = self.client.post(
+                    self.bulk_shopping_url,
+                    content_type='application/json',
+                    data=json.dumps(data),
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST
+                )
+        self.unauthorize_user()
+        response = self.client.post(self.bulk_shopping_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_concurrent_cart_adds_share_new_ingredient(self):
+        another_ingredient = Ingredient.objects.create(
+            name='another_ingredient', measurement_unit='test'
+        )
+        recipes = [
+            self.create_recipe([(another_ingredient, 2)]) for _ in range(5)
+        ]
+        statuses = send_concurrently(self.token, 'post', [
+            f'{self.recipes_endpoint}{recipe.id}/shopping_cart/'
+            for recipe in recipes
+        ])
+        self.assertEqual(statuses, [status.HTTP_201_CREATED] * 5)
+        self.assertEqual(self.get_shopping_list(), {'another_ingredient': 10})
+
+    def test_concurrent_bulk_requests_apply_once(self):
+        second = self.create_recipe([(self.ingredient, 5)])
+        third = self.create_recipe([(self.ingredient, 7)])
+        data = {'ids': [1, second.id, third.id]}
+        for method, expected in (('post', 22), ('delete', None)):
+            with self.subTest(method=method):
+                statuses = send_concurrently(
+                    self.token, method, [self.bulk_shopping_url] * 4, data
+                )
+                self.assertEqual(statuses, [status.HTTP_200_OK] * 4)
+                self.assertEqual(
+                    self.get_shopping_list(),
+                    {'test_ingredient': expected} if expected else {}
+                )
+                self.assertEqual(
+                    set(Recipe.objects.values_list(
+                        'carts_count', flat=True
+                    )),
+                    {1 if expected else 0}
+                )
+        call_command('rebuild_shopping_lists', verify=True, stdout=StringIO())
+
+    def test_shopping_list_follows_admin_changes(self):
+        self.authorize_user(self.token)
+        self.client.post(self.shopping_url)
+        self.create_recipe_in_cart([(self.ingredient, 5)])
+        self.assertEqual(self.get_shopping_list(), {'test_ingredient': 15})
+        request = RequestFactory().post('/admin/')
+        request.user = User.objects.create_superuser(
+            username='admin', password='some_strong_psw'
+        )
+        model_admin = IngredientAmountForRecipeAdmin(
+            IngredientAmountForRecipe, admin.site
+        )
+        row = IngredientAmountForRecipe.objects.get(recipe_id=1)
+        form_class = model_admin.get_form(request, row, change=True)
+        form = form_class(data={
+            'recipe': row.recipe_id,
+            'ingredient': row.ingredient_id,
+            'amount': 20,
+        }, instance=row)
+        self.assertTrue(form.is_valid(), form.errors)
+        model_admin.save_model(request, form.save(commit=False), form, True)
+        self.assertEqual(self.get_shopping_list(), {'test_ingredient': 25})
+        model_admin.delete_queryset(
+            request, IngredientAmountForRecipe.objects.all()
+        )
+        self.assertEqual(self.get_shopping_list(), {})
+        call_command('rebuild_shopping_lists', verify=True, stdout=StringIO())
+
+    def test_shopping_list_follows_orm_deletes(self):
+        self.authorize_user(self.token)
+        self.client.post(self.shopping_url)
+        second = self.create_recipe_in_cart([(self.ingredient, 5)])
+        third = self.create_recipe_in_cart([(self.ingredient, 7)])
+        Cart.objects.filter(recipe=second).delete()
+        self.assertEqual(self.get_shopping_list(), {'test_ingredient': 17})
+        third.delete()
+        self.assertEqual(self.get_shopping_list(), {'test_ingredient': 10})
+        call_command('rebuild_shopping_lists', verify=True, stdout=StringIO())
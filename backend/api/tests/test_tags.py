@@ -1,5 +1,7 @@
 import json
 
+from django.core.cache import cache
+from django.test import override_settings
 from rest_framework import status
 from rest_framework.test import APITransactionTestCase
 
@@ -36,6 +38,9 @@ class TagsAPITests(APITransactionTestCase):
 
         cls.tag_breakfast_data = cls.not_empty_tags_list[0]
 
+    def setUp(self):
+        cache.clear()
+
     def create_tag(self):
         Tag.objects.create(
             name=self.test_tag['name'],
@@ -72,3 +77,61 @@ class TagsAPITests(APITransactionTestCase):
     def test_not_existing_tag_returns_404(self):
         response = self.client.get(self.not_existing_tag)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_not_modified_without_queries(self):
+        self.create_tag()
+        response = self.client.get(self.tags_endpoint)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.tags_endpoint,
+                HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.tags_endpoint,
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_cached_tags_list(self):
+        self.create_tag()
+        response = self.client.get(self.tags_endpoint)
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(self.tags_endpoint)
+        self.assertEqual(cached_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached_response.content, response.content)
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_cache_invalidated_on_tag_change(self):
+        self.create_tag()
+        etag = self.client.get(self.tags_endpoint)['ETag']
+        Tag.objects.filter(pk=1).get().delete()
+        response = self.client.get(
+            self.tags_endpoint,
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), self.empty_tags_list)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_etag_from_content_without_shared_cache(self):
+        self.create_tag()
+        etag = self.client.get(self.tags_endpoint)['ETag']
+        response = self.client.get(
+            self.tags_endpoint,
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Изменение без сигналов: версия в кэше не меняется.
+        Tag.objects.filter(pk=1).update(name='changed')
+        response = self.client.get(
+            self.tags_endpoint,
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)[0]['name'], 'changed')
+        self.assertNotEqual(response['ETag'], etag)
@@ -0,0 +1,33 @@
+import threading
+
+from django.db import connection
+from rest_framework.test import APIClient
+
+
+def send_concurrently(token, method, urls, data=None):
+    """
+    Отправляет запросы method на urls одновременно: каждый из своего
+    потока со своим соединением с БД. Возвращает отсортированный список
+    кодов ответов. Нужен APITransactionTestCase: данные APITestCase не
+    видны из других соединений.
+    """
+    barrier = threading.Barrier(len(urls))
+    statuses = []
+
+    def send(url):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + str(token))
+        try:
+            barrier.wait()
+            statuses.append(getattr(client, method)(
+                url, data=data, format='json'
+            ).status_code)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=send, args=(url,)) for url in urls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(statuses)
@@ -0,0 +1,28 @@
+import time
+from collections import namedtuple
+from uuid import uuid4
+
+from django.core.cache import cache
+
+VERSION_KEY = 'api:version:{}'
+INGREDIENTS_VERSION = 'ingredients'
+TAGS_VERSION = 'tags'
+
+Version = namedtuple('Version', ('token', 'updated'))
+
+
+def new_version():
+    return Version(uuid4().hex, int(time.time()))
+
+
+def get_version(name):
+    """
+    Текущая версия набора данных name: случайный токен и время
+    последнего изменения. Хранится в общем кэше Django, поэтому видна
+    всем воркерам, если кэш общий (например, Redis).
+    """
+    return cache.get_or_set(VERSION_KEY.format(name), new_version, None)
+
+
+def bump_version(name):
+    cache.set(VERSION_KEY.format(name), new_version(), None)
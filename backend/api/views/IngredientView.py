@@ -1,14 +1,16 @@
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
 from api.filters import IngredientSearchFilter
+from api.mixins import CachedReferenceDataMixin
 from api.models import Ingredient
 from api.permissions import AdminOrReadOnly
 from api.serializers import IngredientSerializer
+from api.versions import INGREDIENTS_VERSION
 
 
-class IngredientsViewSet(ReadOnlyModelViewSet):
+class IngredientsViewSet(CachedReferenceDataMixin, ReadOnlyModelViewSet):
+    cache_version = INGREDIENTS_VERSION
     permission_classes = (AdminOrReadOnly,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
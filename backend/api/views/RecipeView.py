@@ -1,5 +1,5 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import action
@@ -11,24 +11,62 @@ from api.filters import RecipeFilter
 from api.models import Cart, Favorite, Recipe
 from api.paginators import CustomPageNumberPagination
 from api.permissions import AuthorOrReadOnly
-from api.serializers import MiniRecipeSerializer, RecipeSerializer
+from api.renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                           ShoppingListTextRenderer)
+from api.serializers import (MiniRecipeSerializer, RecipeIdsSerializer,
+                             RecipeSerializer,
+                             ShoppingCartIngredientSerializer)
+from api.services import (add_recipe_to_shopping_list,
+                          add_recipes_to_shopping_list, change_counter,
+                          delete_recipe_bonds, get_shopping_list,
+                          insert_recipe_bonds,
+                          remove_recipe_from_shopping_list,
+                          remove_recipes_from_shopping_list)
 
 recipe_already_exists_msg = 'Рецепт уже добавлен'
 recipe_already_deleted_msg = 'Рецепт уже удалён'
 
+BULK_CREATED = 'created'
+BULK_DELETED = 'deleted'
+BULK_ALREADY_EXISTS = 'already_exists'
+BULK_ALREADY_DELETED = 'already_deleted'
+BULK_NOT_FOUND = 'not_found'
+
 
 class RecipeViewSet(ModelViewSet):
     permission_classes = (AuthorOrReadOnly,)
     queryset = Recipe.objects.all()
     pagination_class = CustomPageNumberPagination
-    filter_class = RecipeFilter
+    filterset_class = RecipeFilter
     serializer_class = RecipeSerializer
 
+    def get_queryset(self):
+        return Recipe.objects.for_user(self.request.user)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list':
+            context['image_variant'] = 'card'
+        return context
+
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        self.reload_instance(serializer)
 
     def perform_update(self, serializer):
         serializer.save(author=self.request.user)
+        self.reload_instance(serializer)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Списки покупок и счётчик рецептов автора обновляют сигналы.
+        instance.delete()
+
+    def reload_instance(self, serializer):
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk
+        )
 
     @action(
         detail=True,
@@ -36,7 +74,12 @@ class RecipeViewSet(ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def favorite(self, request, pk=None):
-        return self.do_action(request=request, model=Favorite, pk=pk)
+        return self.do_action(
+            request=request,
+            model=Favorite,
+            pk=pk,
+            counter='favorites_count',
+        )
 
     @action(
         detail=True,
@@ -44,58 +87,180 @@ class RecipeViewSet(ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def shopping_cart(self, request, pk=None):
-        return self.do_action(request=request, model=Cart, pk=pk)
+        return self.do_action(
+            request=request,
+            model=Cart,
+            pk=pk,
+            counter='carts_count',
+            on_create=add_recipe_to_shopping_list,
+            on_delete=remove_recipe_from_shopping_list,
+        )
 
     @action(
         detail=False,
-        methods=['GET'],
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        url_name='bulk-favorite',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_favorite(self, request):
+        return self.do_bulk_action(
+            request=request,
+            model=Favorite,
+            counter='favorites_count',
+        )
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart',
+        url_name='bulk-shopping-cart',
         permission_classes=[IsAuthenticated]
     )
+    def bulk_shopping_cart(self, request):
+        return self.do_bulk_action(
+            request=request,
+            model=Cart,
+            counter='carts_count',
+            on_create=add_recipes_to_shopping_list,
+            on_delete=remove_recipes_from_shopping_list,
+        )
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer,
+        ]
+    )
     def download_shopping_cart(self, request):
-        user = request.user
-        ingredients = user.carts.values(
-            'recipe__ingredients__name',
-            'recipe__ingredients__measurement_unit',
-        ).order_by('recipe__ingredients__name').annotate(
-            ingredients_sum=Sum('recipe__ingredientamountforrecipe__amount')
+        ingredients = get_shopping_list(request.user)
+        items = (
+            {
+                'name': item['name'],
+                'amount': item['amount'],
+                'measurement_unit': item['measurement_unit'],
+            } for item in ingredients.iterator()
         )
 
-        list_for_shopping = ''
-        for item in ingredients:
-            name = item['recipe__ingredients__name']
-            amount = (
-                    str(item['ingredients_sum']) +
-                    ' ' +
-                    item['recipe__ingredients__measurement_unit']
-            )
-            list_for_shopping += f'{name}: {amount}\n'
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(items),
+            content_type=f'{renderer.media_type}; '
+                         f'charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{renderer.get_filename()}"'
+        )
+        return response
 
-        return HttpResponse(list_for_shopping, content_type='text/plain')
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_summary(self, request):
+        ingredients = get_shopping_list(request.user)
+        serializer = ShoppingCartIngredientSerializer(ingredients, many=True)
+        return Response(serializer.data)
 
-    def create_bond(self, model, user, recipe):
-        if model.objects.filter(user=user, recipe=recipe).exists():
+    @transaction.atomic
+    def create_bond(self, model, user, recipe, counter, on_create=None):
+        # Один INSERT без предварительного exists(): повтор отсекается
+        # уникальным ограничением, поэтому двойной клик не даёт 500.
+        # Вставка идёт без сигналов, список покупок меняет on_create.
+        if not insert_recipe_bonds(model, user, {recipe.pk}):
             return Response({
                 'errors': recipe_already_exists_msg
             }, status=status.HTTP_400_BAD_REQUEST)
-        model.objects.create(user=user, recipe=recipe)
+        change_counter(Recipe.objects.filter(pk=recipe.pk), counter, 1)
+        if on_create:
+            on_create(user, recipe)
         serializer = MiniRecipeSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    def delete_bond(self, model, user, recipe):
-        bond = model.objects.filter(user=user, recipe=recipe)
-        if bond.exists():
-            bond.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response({
-            'errors': recipe_already_deleted_msg
-        }, status=status.HTTP_400_BAD_REQUEST)
+    @transaction.atomic
+    def delete_bond(self, model, user, recipe, counter, on_delete=None):
+        if not delete_recipe_bonds(model, user, {recipe.pk}):
+            return Response({
+                'errors': recipe_already_deleted_msg
+            }, status=status.HTTP_400_BAD_REQUEST)
+        change_counter(Recipe.objects.filter(pk=recipe.pk), counter, -1)
+        if on_delete:
+            on_delete(user, recipe)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def do_action(self, request, model, pk):
+    def do_action(self, request, model, pk, counter,
+                  on_create=None, on_delete=None):
         user = request.user
         recipe = get_object_or_404(Recipe, pk=pk)
 
         if request.method == 'POST':
-            return self.create_bond(model=model, user=user, recipe=recipe)
+            return self.create_bond(
+                model=model, user=user, recipe=recipe,
+                counter=counter, on_create=on_create
+            )
         elif request.method == 'DELETE':
-            return self.delete_bond(model=model, user=user, recipe=recipe)
+            return self.delete_bond(
+                model=model, user=user, recipe=recipe,
+                counter=counter, on_delete=on_delete
+            )
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @transaction.atomic
+    def create_bonds(self, model, user, recipe_ids, counter, on_create=None):
+        # Созданные связи берутся из RETURNING самой вставки, а не из
+        # чтения до неё: при параллельных запросах с теми же id каждая
+        # связь засчитывается только одному из них.
+        created = insert_recipe_bonds(model, user, recipe_ids)
+        if created:
+            change_counter(Recipe.objects.filter(pk__in=created), counter, 1)
+            if on_create:
+                on_create(user, created)
+        return {
+            pk: BULK_CREATED if pk in created else BULK_ALREADY_EXISTS
+            for pk in recipe_ids
+        }
+
+    @transaction.atomic
+    def delete_bonds(self, model, user, recipe_ids, counter, on_delete=None):
+        deleted = delete_recipe_bonds(model, user, recipe_ids)
+        if deleted:
+            change_counter(Recipe.objects.filter(pk__in=deleted), counter, -1)
+            if on_delete:
+                on_delete(user, deleted)
+        return {
+            pk: BULK_DELETED if pk in deleted else BULK_ALREADY_DELETED
+            for pk in recipe_ids
+        }
+
+    def do_bulk_action(self, request, model, counter,
+                       on_create=None, on_delete=None):
+        """
+        Добавляет или удаляет связи пользователя сразу с несколькими
+        рецептами из {"ids": [...]}. Число запросов к БД не зависит от
+        количества рецептов; для каждого id возвращается свой статус.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        recipe_ids = set(
+            Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        if request.method == 'POST':
+            statuses = self.create_bonds(
+                model=model, user=request.user, recipe_ids=recipe_ids,
+                counter=counter, on_create=on_create
+            )
+        else:
+            statuses = self.delete_bonds(
+                model=model, user=request.user, recipe_ids=recipe_ids,
+                counter=counter, on_delete=on_delete
+            )
+        return Response({'results': [
+            {'id': pk, 'status': statuses.get(pk, BULK_NOT_FOUND)}
+            for pk in ids
+        ]})
@@ -1,11 +1,14 @@
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from api.mixins import CachedReferenceDataMixin
 from api.models import Tag
 from api.permissions import AdminOrReadOnly
 from api.serializers import TagSerializer
+from api.versions import TAGS_VERSION
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(CachedReferenceDataMixin, ReadOnlyModelViewSet):
+    cache_version = TAGS_VERSION
     permission_classes = (AdminOrReadOnly,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -16,6 +16,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
@@ -70,9 +71,44 @@ if os.getenv('GITHUB_WORKFLOW'):
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            # Тестовая база в файле, а не в памяти: иначе параллельные
+            # запросы из тестов на гонки падают с "table is locked".
+            'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
         }
     }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Кэш виден всем процессам (Redis, Memcached, БД). Версии справочников
+# и ответы с ETag по версии держатся в кэше только тогда: локальный кэш
+# воркера не узнает о смене версии в другом процессе.
+CACHE_IS_SHARED = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+REFERENCE_DATA_CACHE_TIMEOUT = int(
+    os.getenv('REFERENCE_DATA_CACHE_TIMEOUT', 60 * 60)
+)
+
+# exact - COUNT(*) на каждый запрос, cached - COUNT(*) кэшируется по
+# тексту запроса, estimated - для запросов без фильтров в PostgreSQL
+# берётся оценка pg_class.reltuples, если она не меньше порога.
+PAGINATION_COUNT_MODE = os.getenv('PAGINATION_COUNT_MODE', 'exact')
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 60)
+)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_THRESHOLD', 100000)
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -128,3 +164,24 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_SEARCH_IN_MEMORY = bool(os.getenv('INGREDIENT_SEARCH_IN_MEMORY'))
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+# Сколько секунд не удалять только что записанный файл изображения без
+# ссылок: его может сохранять незавершённый запрос.
+RECIPE_IMAGE_RELEASE_MIN_AGE = int(
+    os.getenv('RECIPE_IMAGE_RELEASE_MIN_AGE', 60)
+)
+# Строить варианты изображений в запросе, а не в фоновом пуле.
+RECIPE_IMAGE_VARIANTS_SYNC = bool(
+    os.getenv('RECIPE_IMAGE_VARIANTS_SYNC', os.getenv('GITHUB_WORKFLOW'))
+)
+
+# Фильтр ?tags= по битовой маске Recipe.tags_mask вместо EXISTS по
+# таблице связей.
+RECIPE_TAGS_BITMASK_FILTER = bool(os.getenv('RECIPE_TAGS_BITMASK_FILTER'))
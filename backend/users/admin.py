@@ -2,7 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group, User
 
-from users.models import Follow
+from api.mixins import ChangedFieldsAdminMixin
+from users.models import Follow, Profile
 
 admin.site.unregister(User)
 admin.site.unregister(Group)
@@ -39,3 +40,14 @@ class FollowAdmin(admin.ModelAdmin):
         'user',
         'author',
     )
+
+
+@admin.register(Profile)
+class ProfileAdmin(ChangedFieldsAdminMixin, admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'user',
+        'recipes_count',
+        'followers_count',
+    )
+    search_fields = ('user__username',)
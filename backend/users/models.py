@@ -1,15 +1,42 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import OuterRef, Prefetch, Subquery
 
 User = get_user_model()
 
 
+class FollowQuerySet(models.QuerySet):
+    def with_recipes(self, recipes_limit=None):
+        """
+        Подписки вместе с профилем автора и его последними recipes_limit
+        рецептами (author.limited_recipes). Число запросов не зависит от
+        количества подписок.
+        """
+        from api.models import Recipe
+
+        recipes = Recipe.objects.all()
+        if recipes_limit is not None:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('id')[:recipes_limit]
+            ))
+        return self.select_related('author__profile').prefetch_related(
+            Prefetch(
+                'author__recipes',
+                queryset=recipes,
+                to_attr='limited_recipes',
+            )
+        )
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='follower',
         verbose_name='Подписчик',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -18,13 +45,45 @@ class Follow(models.Model):
         verbose_name='Автор',
     )
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         ordering = ['-id']
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='follow_user_id_idx'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
                 name='unique follow',
             )
         ]
+
+
+class Profile(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+        verbose_name='Пользователь',
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков',
+    )
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self):
+        return str(self.user)
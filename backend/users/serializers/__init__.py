@@ -1,8 +1,13 @@
-from .follow_serializer import FollowSerializer
+# isort: off
+# user_serializer первым: follow_serializer импортирует api.serializers,
+# а тот берёт отсюда CustomUserSerializer.
 from .user_serializer import CustomUserCreateSerializer, CustomUserSerializer
+from .follow_serializer import FollowSerializer, get_recipes_limit
+# isort: on
 
 __all__ = [
     'CustomUserSerializer',
     'CustomUserCreateSerializer',
     'FollowSerializer',
+    'get_recipes_limit',
 ]
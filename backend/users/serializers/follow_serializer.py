@@ -21,23 +21,32 @@ class FollowSerializer(serializers.ModelSerializer):
                   'is_subscribed', 'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
-        if isinstance(obj, tuple):
-            obj = obj[0]
-        return Follow.objects.filter(
-            user=obj.user, author=obj.author
-        ).exists()
+        # Сериализуется сама подписка, значит пользователь подписан.
+        return True
 
     def get_recipes(self, obj):
         if isinstance(obj, tuple):
             obj = obj[0]
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.author)
-        if limit:
-            queryset = queryset[:int(limit)]
+        queryset = getattr(obj.author, 'limited_recipes', None)
+        if queryset is None:
+            queryset = Recipe.objects.filter(author=obj.author)
+            limit = get_recipes_limit(self.context.get('request'))
+            if limit is not None:
+                queryset = queryset[:limit]
         return api.serializers.MiniRecipeSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
         if isinstance(obj, tuple):
             obj = obj[0]
+        profile = getattr(obj.author, 'profile', None)
+        if profile is not None:
+            return profile.recipes_count
         return Recipe.objects.filter(author=obj.author).count()
+
+
+def get_recipes_limit(request):
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit >= 0 else None
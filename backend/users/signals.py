@@ -0,0 +1,13 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from users.models import Profile
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def create_profile(instance, created, **kwargs):
+    if created:
+        Profile.objects.get_or_create(user=instance)
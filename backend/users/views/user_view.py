@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -7,8 +8,9 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from api.paginators import CustomPageNumberPagination
+from api.services import change_followers_count
 from users.models import Follow
-from users.serializers import FollowSerializer
+from users.serializers import FollowSerializer, get_recipes_limit
 
 User = get_user_model()
 
@@ -35,22 +37,29 @@ class CustomUserViewSet(UserViewSet):
                         "errors": self_follow_error
                     }, status=status.HTTP_400_BAD_REQUEST
                 )
-            if Follow.objects.filter(user=user, author=author).exists():
+            try:
+                with transaction.atomic():
+                    follow = Follow.objects.create(user=user, author=author)
+                    change_followers_count(author, 1)
+            except IntegrityError:
                 return Response(
                     {
                         "errors": follow_twice_error
                     }, status=status.HTTP_400_BAD_REQUEST
                 )
-            follow = Follow.objects.create(user=user, author=author)
             serializer = FollowSerializer(
                 follow, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            follow = Follow.objects.filter(user=user, author=author)
-            if follow.exists():
-                follow.delete()
+            with transaction.atomic():
+                deleted, _ = Follow.objects.filter(
+                    user=user, author=author
+                ).delete()
+                if deleted:
+                    change_followers_count(author, -1)
+            if deleted:
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(
                 {
@@ -65,7 +74,9 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = user.follower.all()
+        queryset = user.follower.with_recipes(
+            recipes_limit=get_recipes_limit(request)
+        )
         pages = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             pages,